@@ -0,0 +1,66 @@
+"""Compare per-message CPU cost of broadcast encoding by room size.
+
+  per-recipient : 수신자마다 json.dumps (기존 send_json 방식)
+  once/<backend>: 메시지당 한 번만 인코딩하고 같은 프레임을 공유
+
+Usage: python scripts/bench_encoding.py [--messages 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src import frames  # noqa: E402
+
+ROOM_SIZES = (1, 10, 100, 500)
+PAYLOAD = {
+    "type": "chat",
+    "from": "홍길동",
+    "message": "안녕하세요! 오늘 회의는 3시에 시작합니다. @alice 자료 공유 부탁드려요 🙏",
+    "color": "#1a73e8",
+    "reply_to_id": 1234,
+    "timestamp": "2026-01-01T12:00:00+00:00",
+    "id": 98765,
+}
+
+
+def per_recipient(payload, members: int):
+    for _ in range(members):
+        json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def once(payload, members: int):
+    frame = frames.encode(payload)
+    for _ in range(members):
+        _ = frame
+
+
+def measure(fn, members: int, messages: int) -> float:
+    start = time.process_time()
+    for i in range(messages):
+        fn(dict(PAYLOAD, id=i), members)
+    return (time.process_time() - start) / messages * 1e6  # µs per message
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    backends = ["json"] + (["orjson"] if frames.orjson is not None else [])
+    header = f"{'members':>8} {'per-recipient':>14}" + "".join(f" {'once/' + b:>12}" for b in backends)
+    print("CPU µs per broadcast message")
+    print(header)
+    for members in ROOM_SIZES:
+        row = f"{members:>8} {measure(per_recipient, members, args.messages):>14.1f}"
+        for b in backends:
+            frames.use_backend(b)
+            row += f" {measure(once, members, args.messages):>12.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure event-loop stalls caused by database calls under concurrent traffic.
+
+동시에 여러 클라이언트가 메시지를 저장/조회하는 상황을 흉내 내면서
+5ms 주기 타이머의 지연(=이벤트 루프가 막힌 시간)을 측정합니다.
+  - sync  : 코루틴 안에서 database.py 함수를 직접 호출 (기존 방식)
+  - async : async_db 파사드를 통해 DB 스레드 풀에서 실행
+
+Usage: python scripts/bench_loop_stall.py [--clients 50] [--seconds 5] [--rows 20000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src import database, async_db  # noqa: E402
+
+TICK = 0.005
+
+
+async def monitor(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - start - TICK))
+
+
+async def client(i: int, mode: str, stop: asyncio.Event, counter: list):
+    payload = {"type": "chat", "from": f"user{i}", "message": "hello " * 10, "color": "#1a73e8"}
+    n = 0
+    while not stop.is_set():
+        if mode == "sync":
+            database.log_message("bench", payload)
+            if n % 5 == 0:
+                database.get_past_logs("bench")
+            await asyncio.sleep(0)
+        else:
+            await async_db.log_message("bench", payload)
+            if n % 5 == 0:
+                await async_db.get_past_logs("bench")
+        n += 1
+        counter[0] += 1
+
+
+async def run(mode: str, clients: int, seconds: float):
+    stop = asyncio.Event()
+    lags, counter = [], [0]
+    tasks = [asyncio.create_task(monitor(stop, lags))]
+    tasks += [asyncio.create_task(client(i, mode, stop, counter)) for i in range(clients)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    lags_ms = sorted(x * 1000 for x in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{mode:5s}  ops/s={counter[0] / seconds:8.0f}  ticks={len(lags_ms):5d}  "
+          f"lag mean={statistics.mean(lags_ms):7.2f}ms  p99={p99:7.2f}ms  max={lags_ms[-1]:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=20000, help="rows preloaded into chat_logs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+        with database._writer() as conn:
+            conn.executemany(
+                "INSERT INTO chat_logs (room, username, message, type) VALUES (?, ?, ?, 'chat')",
+                ((f"room{i % 100}", "seed", "seed message") for i in range(args.rows)),
+            )
+        for mode in ("sync", "async"):
+            asyncio.run(run(mode, args.clients, args.seconds))
+        asyncio.run(async_db.close())
+
+
+if __name__ == "__main__":
+    main()
@@ -34,9 +34,11 @@ async def test_features():
                 print(f"📨 Received: {data.get('type')}")
 
                 # Capture a message ID for testing replies/reactions
-                if data.get('type') == 'chat' and data.get('id'):
-                    msg_id = data['id']
-                    print(f"   💾 Captured msg_id: {msg_id}")
+                batch = data.get('messages', []) if data.get('type') == 'history' else [data]
+                for item in batch:
+                    if item.get('type') == 'chat' and item.get('id'):
+                        msg_id = item['id']
+                        print(f"   💾 Captured msg_id: {msg_id}")
 
             except asyncio.TimeoutError:
                 print("⏱️  No more past logs")
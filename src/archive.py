@@ -0,0 +1,66 @@
+"""Cold archive segments for chat_logs
+
+보존 기간이나 최대 행 수를 넘긴 메시지는 chat_logs에서 빼서 방별 압축 세그먼트로 옮깁니다.
+
+  data/archive/<방 이름 해시>/<first_id>-<last_id>-<uuid>.jsonl.gz
+
+세그먼트는 한 번 쓰면 바꾸지 않고 새 세그먼트만 추가합니다(append-only). 각 세그먼트의
+ID 범위는 archive_segments 테이블에 기록되어, 과거 기록 페이지 조회가 DB에 남은 행과
+세그먼트의 행을 합쳐 돌려줄 수 있습니다. 행에는 옮길 당시의 리액션이 함께 들어 있습니다.
+세그먼트는 바뀌지 않으므로 최근에 읽은 것은 메모리에 캐시합니다.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from uuid import uuid4
+
+ARCHIVE_DIR = os.path.join("data", "archive")
+SEGMENT_CACHE_SIZE = 16
+
+
+def room_dir(room: str) -> str:
+    # 방 이름을 그대로 경로에 쓰지 않음
+    return os.path.join(ARCHIVE_DIR, hashlib.sha1(room.encode("utf-8")).hexdigest()[:16])
+
+
+def write_segment(room: str, rows: List[Dict[str, Any]]) -> str:
+    """rows(오래된 순)를 새 세그먼트 파일로 쓰고 경로를 반환합니다. 디스크에 기록된 뒤 반환."""
+    directory = room_dir(room)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{rows[0]['id']}-{rows[-1]['id']}-{uuid4().hex[:8]}.jsonl.gz")
+    staging = path + ".part"
+    with open(staging, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+            for row in rows:
+                out.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                out.write(b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())  # 원본 행을 지우기 전에 기록을 보장
+    os.replace(staging, path)
+    return path
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def read_segment(path: str) -> Tuple[Dict[str, Any], ...]:
+    """세그먼트의 행들(오래된 순). 캐시된 dict를 공유하므로 수정하지 말 것."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(json.loads(line) for line in f if line.strip())
+
+
+def remove_segments(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    read_segment.cache_clear()
+
+
+def remove_room(room: str):
+    """방의 세그먼트 디렉터리를 통째로 지웁니다."""
+    shutil.rmtree(room_dir(room), ignore_errors=True)
+    read_segment.cache_clear()
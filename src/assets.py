@@ -0,0 +1,124 @@
+"""Content-hashed static assets
+
+시작할 때 static/ 아래 파일을 읽어 내용 해시가 들어간 이름(client.3f9a1c2b7d4e.js)을
+붙이고, 압축할 만한 파일은 gzip·brotli 버전을 미리 만들어 메모리에 둡니다. 템플릿은
+asset_url('client.js')로 해시 이름을 얻으므로 파일을 고치면 주소가 바뀌고, 해시 이름은
+내용이 바뀌지 않으니 immutable로 오래 캐시할 수 있습니다.
+
+brotli 패키지가 없으면 gzip 버전만 만듭니다.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, List, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+HASH_LENGTH = 12
+MIN_COMPRESS_BYTES = 512
+MAX_ASSET_BYTES = 8 * 1024 * 1024  # 이보다 큰 파일은 해시 이름 없이 그대로 제공
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+class Asset:
+    __slots__ = ("path", "hashed", "digest", "media_type", "variants")
+
+    def __init__(self, path: str, hashed: str, digest: str, media_type: str,
+                 variants: Dict[str, bytes]):
+        self.path = path              # static/ 기준 상대 경로
+        self.hashed = hashed          # 해시가 들어간 상대 경로
+        self.digest = digest
+        self.media_type = media_type
+        self.variants = variants      # "identity" | "gzip" | "br" -> 본문
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+class AssetManifest:
+    def __init__(self, directory: str = "static"):
+        self.directory = directory
+        self._by_path: Dict[str, Asset] = {}
+        self._by_hashed: Dict[str, Asset] = {}
+
+    def build(self):
+        """static/ 전체를 다시 읽어 manifest를 만듭니다. (파일 I/O·압축이므로 스레드에서 호출)"""
+        by_path: Dict[str, Asset] = {}
+        for rel, full in self._files():
+            if os.path.getsize(full) > MAX_ASSET_BYTES:
+                continue
+            with open(full, "rb") as f:
+                data = f.read()
+            by_path[rel] = _make_asset(rel, data)
+        self._by_path = by_path
+        self._by_hashed = {a.hashed: a for a in by_path.values()}
+
+    def url(self, path: str) -> str:
+        """템플릿용: static/ 기준 경로 → 해시 이름의 URL. manifest에 없으면 원래 URL."""
+        asset = self._by_path.get(path)
+        return f"/static/{asset.hashed if asset else path}"
+
+    def lookup(self, path: str) -> Tuple[Asset | None, bool]:
+        """(Asset, 해시 이름으로 요청했는지). 없으면 (None, False)."""
+        asset = self._by_hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self._by_path.get(path), False
+
+    def stats(self) -> Dict[str, int]:
+        assets = list(self._by_path.values())
+        return {
+            "assets": len(assets),
+            "bytes": sum(len(a.variants["identity"]) for a in assets),
+            "gzip_bytes": sum(len(a.variants.get("gzip", b"")) for a in assets),
+            "br_bytes": sum(len(a.variants.get("br", b"")) for a in assets),
+            "brotli": brotli is not None,
+        }
+
+    def _files(self) -> List[Tuple[str, str]]:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full = os.path.join(root, name)
+                files.append((os.path.relpath(full, self.directory).replace(os.sep, "/"), full))
+        return sorted(files)
+
+
+def negotiate(accept_encoding: str | None, available) -> str:
+    """Accept-Encoding에서 q가 0이 아닌 것 중 br > gzip 순으로 고르고, 없으면 identity."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def _make_asset(rel: str, data: bytes) -> Asset:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(rel)
+    media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+    variants = {"identity": data}
+    if len(data) >= MIN_COMPRESS_BYTES and media_type.startswith(COMPRESSIBLE_TYPES):
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            variants["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                variants["br"] = compressed
+    return Asset(rel, f"{base}.{digest}{ext}", digest, media_type, variants)
@@ -0,0 +1,126 @@
+"""Async facade for database.py
+
+모든 DB 호출을 전용 스레드 풀(크기 제한)에서 실행하여
+느린 커밋이나 긴 조회가 이벤트 루프를 막지 않도록 합니다.
+database.py의 함수마다 같은 이름의 awaitable 버전을 제공합니다.
+함수별 실행 시간과 스레드를 기다린 시간은 metrics에 기록합니다.
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from . import database, metrics
+
+DB_WORKERS = int(os.environ.get("DB_WORKERS", "4"))
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """동기 DB 함수를 DB 스레드 풀에서 실행하고 결과를 기다립니다."""
+    loop = asyncio.get_running_loop()
+    queued = time.perf_counter()
+    started, elapsed, result, error = await loop.run_in_executor(
+        _get_executor(), _timed, functools.partial(fn, *args, **kwargs))
+    # 히스토그램은 이벤트 루프 스레드에서만 갱신
+    metrics.db_wait_seconds.observe(started - queued)
+    metrics.db_seconds.observe(elapsed, getattr(fn, "__name__", "unknown"))
+    if error is not None:
+        raise error
+    return result
+
+
+def _timed(call: Callable[[], Any]):
+    started = time.perf_counter()
+    try:
+        result, error = call(), None
+    except Exception as e:
+        result, error = None, e
+    return started, time.perf_counter() - started, result, error
+
+
+def _awaitable(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+async def close():
+    """연결을 닫고 스레드 풀을 종료합니다. (서버 종료 시 호출)"""
+    global _executor
+    if _executor is None:
+        database.close_connections()
+        return
+    await run(database.close_connections)
+    _executor.shutdown(wait=True)
+    _executor = None
+
+
+init_db = _awaitable(database.init_db)
+load_room_cache = _awaitable(database.load_room_cache)
+log_message = _awaitable(database.log_message)
+log_messages = _awaitable(database.log_messages)
+set_message_thumb = _awaitable(database.set_message_thumb)
+reserve_message_ids = _awaitable(database.reserve_message_ids)
+get_past_logs = _awaitable(database.get_past_logs)
+get_logs_before = _awaitable(database.get_logs_before)
+get_logs_after = _awaitable(database.get_logs_after)
+search_messages = _awaitable(database.search_messages)
+
+add_room = _awaitable(database.add_room)
+get_room_password = _awaitable(database.get_room_password)
+get_all_rooms = _awaitable(database.get_all_rooms)
+delete_room_db = _awaitable(database.delete_room_db)
+room_exists = _awaitable(database.room_exists)
+
+set_pinned_message = _awaitable(database.set_pinned_message)
+get_pinned_message_id = _awaitable(database.get_pinned_message_id)
+
+add_reaction = _awaitable(database.add_reaction)
+remove_reaction = _awaitable(database.remove_reaction)
+get_reactions = _awaitable(database.get_reactions)
+get_message_by_id = _awaitable(database.get_message_by_id)
+
+add_upload_ref = _awaitable(database.add_upload_ref)
+get_upload_ref = _awaitable(database.get_upload_ref)
+get_upload_refs = _awaitable(database.get_upload_refs)
+remove_upload_refs = _awaitable(database.remove_upload_refs)
+claim_lease = _awaitable(database.claim_lease)
+release_lease = _awaitable(database.release_lease)
+get_room_upload_bytes = _awaitable(database.get_room_upload_bytes)
+get_upload_stats = _awaitable(database.get_upload_stats)
+
+create_upload_session = _awaitable(database.create_upload_session)
+get_upload_session = _awaitable(database.get_upload_session)
+add_upload_chunk = _awaitable(database.add_upload_chunk)
+set_upload_session_state = _awaitable(database.set_upload_session_state)
+delete_upload_session = _awaitable(database.delete_upload_session)
+expire_upload_sessions = _awaitable(database.expire_upload_sessions)
+
+get_retention_policies = _awaitable(database.get_retention_policies)
+set_retention_policy = _awaitable(database.set_retention_policy)
+archive_room_logs = _awaitable(database.archive_room_logs)
+get_archive_stats = _awaitable(database.get_archive_stats)
+get_archived_through = _awaitable(database.get_archived_through)
+incremental_vacuum = _awaitable(database.incremental_vacuum)
+
+get_room_deletion = _awaitable(database.get_room_deletion)
+get_pending_room_deletions = _awaitable(database.get_pending_room_deletions)
+claim_room_deletion = _awaitable(database.claim_room_deletion)
+delete_room_logs_batch = _awaitable(database.delete_room_logs_batch)
+delete_room_archive = _awaitable(database.delete_room_archive)
+finish_room_deletion = _awaitable(database.finish_room_deletion)
+update_room_deletion = _awaitable(database.update_room_deletion)
+
+migrate_if_old_schema = _awaitable(database.migrate_if_old_schema)
@@ -0,0 +1,293 @@
+"""Pub/sub backplane between worker processes
+
+broadcast()는 페이로드를 backplane에 publish하고, backplane은 이를 모든 워커의
+deliver(room, payload, origin) 콜백에 전달합니다. 각 워커는 자기 프로세스에 붙은
+연결에만 프레임을 보냅니다.
+
+  - LocalBackplane  : 단일 프로세스. publish가 곧바로 로컬 deliver
+  - SQLiteBackplane : 같은 호스트의 여러 워커(uvicorn --workers N)가 공유 SQLite 파일의
+                      이벤트 테이블로 메시지를 주고받음. 각 워커가 poll_ms마다 새 이벤트를 읽음
+
+다른 워커의 참가자 목록은 presence 이벤트로 유지하고(remote_members), 하트비트가
+끊긴 워커의 참가자는 로컬에서 leave 이벤트를 만들어 정리합니다.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from . import frames
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, Dict[str, Any], str], Awaitable[None]]
+
+
+class LocalBackplane:
+    name = "local"
+
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid4().hex[:6]}"
+        self.published = 0
+        self.received = 0  # 다른 워커에서 받은 이벤트
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, room: str, payload: Dict[str, Any]):
+        self.published += 1
+        if self._deliver is not None:
+            await self._deliver(room, payload, self.worker_id)
+
+    def remote_members(self, room: str) -> List[str]:
+        """다른 워커에 접속한 이 방의 사용자 이름 (중복 포함)."""
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "worker_id": self.worker_id,
+                "published": self.published, "received": self.received}
+
+
+class SQLiteBackplane(LocalBackplane):
+    name = "sqlite"
+
+    def __init__(self, path: str, poll_ms: int = 50, retention_s: float = 60.0,
+                 worker_timeout_s: float = 10.0):
+        super().__init__()
+        self.path = path
+        self.poll_interval = max(1, poll_ms) / 1000
+        self.retention = retention_s
+        self.worker_timeout = worker_timeout_s
+        self.expired = 0  # 하트비트가 끊겨 정리한 (방, 워커) 수
+        self._outgoing: List[Tuple[str, str, Dict[str, Any]]] = []
+        self._remote: Dict[str, Dict[str, Counter]] = {}  # room -> origin -> Counter(username)
+        self._last_id = 0
+        self._last_maintenance = 0.0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._conn: sqlite3.Connection | None = None
+        # 공유 DB 연결은 전용 스레드 하나에서만 사용
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backplane")
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        members = await self._run(self._open)
+        for room, origin, username, count in members:
+            self._remote.setdefault(room, {}).setdefault(origin, Counter())[username] += count
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            try:
+                await self._run(self._close)
+            except Exception:
+                logger.exception("backplane: failed to unregister worker %s", self.worker_id)
+        self._executor.shutdown(wait=False)
+        await super().stop()
+
+    async def publish(self, room: str, payload: Dict[str, Any]):
+        self.published += 1
+        text = frames.encode(payload)
+        self._outgoing.append((room, text, payload))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._deliver is not None:
+            await self._deliver(room, payload, self.worker_id)
+
+    def remote_members(self, room: str) -> List[str]:
+        names: List[str] = []
+        for counts in self._remote.get(room, {}).values():
+            names.extend(counts.elements())
+        return names
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path, "last_event_id": self._last_id,
+                "pending": len(self._outgoing), "expired": self.expired}
+
+    # --- 이벤트 루프 쪽 ---
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            batch, self._outgoing = self._outgoing, []
+            try:
+                events, live = await self._run(self._sync, batch)
+            except Exception:
+                logger.exception("backplane: sync failed")
+                self._outgoing[:0] = batch  # 다음 주기에 다시 시도
+                await asyncio.sleep(self.poll_interval)
+                continue
+            for room, origin, text in events:
+                self.received += 1
+                try:
+                    payload = json.loads(text)
+                    self._apply_presence(room, origin, payload)
+                    await self._deliver(room, payload, origin)
+                except Exception:
+                    logger.exception("backplane: failed to deliver event for room %s", room)
+            if live is not None:
+                await self._expire_workers(live)
+
+    def _apply_presence(self, room: str, origin: str, payload: Dict[str, Any]):
+        if payload.get("type") != "presence":
+            return
+        counts = self._remote.setdefault(room, {}).setdefault(origin, Counter())
+        op, user = payload.get("op"), payload.get("user")
+        if op == "join":
+            counts[user] += 1
+        elif op == "leave":
+            counts[user] -= 1
+        elif op == "rename":
+            counts[payload.get("old")] -= 1
+            counts[user] += 1
+        for name in [n for n, c in counts.items() if c <= 0]:
+            del counts[name]
+        if not counts:
+            del self._remote[room][origin]
+            if not self._remote[room]:
+                del self._remote[room]
+
+    async def _expire_workers(self, live: set):
+        """하트비트가 끊긴 워커의 참가자·입력 상태를 로컬에서 정리합니다."""
+        for room in list(self._remote):
+            for origin in [o for o in self._remote[room] if o not in live]:
+                self.expired += 1
+                for user in list(self._remote[room][origin].elements()):
+                    payload = {"type": "presence", "op": "leave", "user": user}
+                    self._apply_presence(room, origin, payload)
+                    await self._deliver(room, payload, origin)
+                await self._deliver(room, {"type": "typing", "users": []}, origin)
+                if room not in self._remote:
+                    break
+
+    # --- 전용 스레드 쪽 ---
+
+    def _open(self) -> List[tuple]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        with conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS backplane_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                room TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS backplane_presence (
+                worker TEXT NOT NULL,
+                room TEXT NOT NULL,
+                username TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (worker, room, username)
+            ) WITHOUT ROWID""")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS backplane_workers (
+                worker TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            )""")
+        self._conn = conn
+        now = time.time()
+        # 시작 시점의 다른 워커 참가자와 마지막 이벤트 ID를 한 트랜잭션에서 읽음
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO backplane_workers (worker, last_seen) VALUES (?, ?)",
+                         (self.worker_id, now))
+            self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM backplane_events").fetchone()[0]
+            members = conn.execute("""
+                SELECT p.room, p.worker, p.username, p.count FROM backplane_presence p
+                JOIN backplane_workers w ON w.worker = p.worker
+                WHERE p.worker != ? AND w.last_seen >= ?""",
+                (self.worker_id, now - self.worker_timeout)).fetchall()
+        return members
+
+    def _close(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM backplane_presence WHERE worker = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM backplane_workers WHERE worker = ?", (self.worker_id,))
+        self._conn.close()
+        self._conn = None
+
+    def _sync(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        """보낼 이벤트 저장 + 새 이벤트 읽기. 가끔 하트비트·오래된 이벤트 정리도 함께 합니다."""
+        conn = self._conn
+        now = time.time()
+        live = None
+        with conn:
+            if batch:
+                conn.executemany(
+                    "INSERT INTO backplane_events (origin, room, payload, created_at) VALUES (?, ?, ?, ?)",
+                    [(self.worker_id, room, text, now) for room, text, _ in batch])
+                for room, _, payload in batch:
+                    self._record_presence(conn, room, payload)
+            if now - self._last_maintenance >= min(1.0, self.worker_timeout / 3):
+                self._last_maintenance = now
+                conn.execute("INSERT OR REPLACE INTO backplane_workers (worker, last_seen) VALUES (?, ?)",
+                             (self.worker_id, now))
+                conn.execute("DELETE FROM backplane_events WHERE created_at < ?", (now - self.retention,))
+                cutoff = now - self.worker_timeout
+                conn.execute("""DELETE FROM backplane_presence WHERE worker IN
+                                (SELECT worker FROM backplane_workers WHERE last_seen < ?)""", (cutoff,))
+                conn.execute("DELETE FROM backplane_workers WHERE last_seen < ?", (cutoff,))
+                live = {row[0] for row in conn.execute("SELECT worker FROM backplane_workers")}
+            rows = conn.execute(
+                "SELECT id, origin, room, payload FROM backplane_events WHERE id > ? ORDER BY id",
+                (self._last_id,)).fetchall()
+        events = []
+        for event_id, origin, room, text in rows:
+            self._last_id = event_id
+            if origin != self.worker_id:
+                events.append((room, origin, text))
+        return events, live
+
+    def _record_presence(self, conn: sqlite3.Connection, room: str, payload: Dict[str, Any]):
+        # 새로 시작하는 워커가 읽을 수 있도록 이 워커의 참가자 수를 공유 테이블에 반영
+        if payload.get("type") != "presence":
+            return
+        op, user = payload.get("op"), payload.get("user")
+        changes = {"join": [(user, 1)], "leave": [(user, -1)],
+                   "rename": [(payload.get("old"), -1), (user, 1)]}.get(op, [])
+        for username, delta in changes:
+            conn.execute("""
+                INSERT INTO backplane_presence (worker, room, username, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (worker, room, username) DO UPDATE SET count = count + excluded.count""",
+                (self.worker_id, room, username, delta))
+        conn.execute("DELETE FROM backplane_presence WHERE worker = ? AND room = ? AND count <= 0",
+                     (self.worker_id, room))
+
+
+def create_backplane(kind: str, path: str, poll_ms: int = 50) -> LocalBackplane:
+    if kind == "local":
+        return LocalBackplane()
+    if kind == "sqlite":
+        return SQLiteBackplane(path, poll_ms=poll_ms)
+    raise ValueError(f"unknown backplane: {kind!r} (expected local or sqlite)")
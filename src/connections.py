@@ -0,0 +1,103 @@
+"""Live WebSocket connection registry
+
+연결마다 Session 하나를 두고 방별 목록(room -> {ws: Session})과
+역방향 인덱스(ws -> Session)를 함께 유지합니다. 연결이 끊길 때 모든 방을
+훑지 않고 O(1)로 제거하며, 방별 접속자 수를 바로 조회할 수 있습니다.
+"""
+import time
+from typing import Any, Dict, Iterator, List
+
+from .fanout import Outbox
+
+
+class Session:
+    __slots__ = ("ws", "room", "username", "color", "outbox",
+                 "connected_at", "last_seen", "received", "queued")
+
+    def __init__(self, ws: Any, room: str, username: str, color: str, outbox: Outbox | None = None):
+        self.ws = ws
+        self.room = room
+        self.username = username
+        self.color = color
+        self.outbox = outbox
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.received = 0  # 클라이언트에서 받은 프레임
+        self.queued = 0    # 송신 큐에 넣은 프레임
+
+    def seen(self):
+        self.received += 1
+        self.last_seen = time.monotonic()
+
+    def offer(self, frame: str, msg_type: str | None = None) -> bool:
+        if self.outbox is None:
+            return False
+        self.queued += 1
+        return self.outbox.offer(frame, msg_type)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "room": self.room,
+            "username": self.username,
+            "connected_at": self.connected_at,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+            "received": self.received,
+            "queued": self.queued,
+            "queue_depth": self.outbox.depth if self.outbox else 0,
+        }
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._rooms: Dict[str, Dict[Any, Session]] = {}
+        self._by_ws: Dict[Any, Session] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_ws)
+
+    def __contains__(self, room: str) -> bool:
+        return room in self._rooms
+
+    def add(self, session: Session):
+        self._by_ws[session.ws] = session
+        self._rooms.setdefault(session.room, {})[session.ws] = session
+
+    def get(self, ws: Any) -> Session | None:
+        return self._by_ws.get(ws)
+
+    def remove(self, ws: Any) -> Session | None:
+        """연결을 제거하고 그 Session을 반환합니다. 이미 없으면 None."""
+        session = self._by_ws.pop(ws, None)
+        if session is None:
+            return None
+        members = self._rooms.get(session.room)
+        if members is not None:
+            members.pop(ws, None)
+            if not members:
+                del self._rooms[session.room]
+        return session
+
+    def drop_room(self, room: str) -> List[Session]:
+        """방의 모든 연결을 레지스트리에서 빼고 반환합니다. (방 삭제 시)"""
+        members = self._rooms.pop(room, {})
+        for ws in members:
+            self._by_ws.pop(ws, None)
+        return list(members.values())
+
+    def members(self, room: str) -> List[Session]:
+        return list(self._rooms.get(room, {}).values())
+
+    def usernames(self, room: str) -> List[str]:
+        return sorted(s.username for s in self._rooms.get(room, {}).values())
+
+    def sessions(self) -> Iterator[Session]:
+        return iter(list(self._by_ws.values()))
+
+    # --- introspection ---
+
+    def count(self, room: str) -> int:
+        return len(self._rooms.get(room, ()))
+
+    def counts(self) -> Dict[str, int]:
+        """방별 현재 접속 수."""
+        return {room: len(members) for room, members in self._rooms.items()}
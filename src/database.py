@@ -1,15 +1,116 @@
 import sqlite3
 import os
-from typing import List, Dict, Any
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from . import archive
+from .room_cache import room_cache
 
 # 데이터베이스 파일 경로 설정
 DB_FILE = os.path.join("data", "data.db")
 
+# --- Search ---
+_SEARCHABLE_TYPES = "('chat', 'file')"  # 전문 검색 색인에 넣는 메시지 종류
+SEARCH_MAX_TERMS = 8
+SNIPPET_TOKENS = 12  # snippet에 담는 최대 토큰 수
+_MAX_ID = 2 ** 63 - 1
+fts_available = False  # init_db()에서 FTS5 지원 여부로 설정
+
+
+class RoomDeletedError(Exception):
+    """삭제 정리 중인 방에 쓰려고 할 때."""
+
+
+# --- Connection Layer ---
+# 연결은 한 번 열어 재사용합니다. WAL 모드이므로 읽기 연결(스레드별)은
+# 쓰기 트랜잭션이 진행 중이어도 막히지 않고, 쓰기는 단일 연결에서 직렬화됩니다.
+
+_PRAGMAS = (
+    # 새 DB 파일에만 적용됨 (WAL 전환·테이블 생성 전이어야 함). 보관 후 빈 공간을 조금씩 반환
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # WAL에서는 NORMAL로도 손상 없이 안전
+    "PRAGMA cache_size=-16000",    # 16MB 페이지 캐시
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256  # 연결별 prepared statement 캐시 크기
+
+_write_lock = threading.RLock()
+_writer_conn: sqlite3.Connection | None = None
+_local = threading.local()
+_open_conns: List[sqlite3.Connection] = []
+_open_conns_lock = threading.Lock()
+_generation = 0  # close_connections() 호출 시 증가 → 스레드별 연결 재생성
+
+def _open_connection() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    with _open_conns_lock:
+        _open_conns.append(conn)
+    return conn
+
+@contextmanager
+def _reader() -> Iterator[sqlite3.Connection]:
+    """현재 스레드 전용 읽기 연결을 빌려줍니다."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "generation", None) != _generation:
+        conn = _open_connection()
+        _local.conn = conn
+        _local.generation = _generation
+    yield conn
+
+@contextmanager
+def _writer() -> Iterator[sqlite3.Connection]:
+    """공유 쓰기 연결을 잠그고 빌려줍니다. 정상 종료 시 커밋, 예외 시 롤백합니다."""
+    global _writer_conn
+    with _write_lock:
+        if _writer_conn is None:
+            _writer_conn = _open_connection()
+        try:
+            yield _writer_conn
+            _writer_conn.commit()
+        except Exception:
+            _writer_conn.rollback()
+            raise
+
+def close_connections():
+    """열려 있는 모든 연결을 닫습니다. (서버 종료 시 호출)"""
+    global _writer_conn, _generation
+    with _write_lock, _open_conns_lock:
+        for conn in _open_conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _open_conns.clear()
+        _writer_conn = None
+        _generation += 1
+    room_cache.clear()
+
 def init_db():
     """데이터베이스와 테이블들을 초기화합니다."""
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    with _writer() as conn:
+        _init_schema(conn.cursor())
+        load_room_cache(conn)
+
+def load_room_cache(conn: sqlite3.Connection | None = None):
+    """rooms 테이블 전체를 방 메타데이터 캐시에 읽어 둡니다."""
+    if conn is None:
+        with _reader() as conn:
+            rows = conn.execute("SELECT name, password, pinned_message_id FROM rooms").fetchall()
+    else:
+        rows = conn.execute("SELECT name, password, pinned_message_id FROM rooms").fetchall()
+    room_cache.load(tuple(row) for row in rows)
+
+def _init_schema(cursor: sqlite3.Cursor):
 
     # chat_logs 테이블 생성
     cursor.execute("""
@@ -24,7 +125,8 @@ def init_db():
         filename TEXT,
         color TEXT,
         reply_to_id INTEGER,
-        reactions TEXT DEFAULT '{}'
+        reactions TEXT DEFAULT '{}',
+        thumb_url TEXT
     )
     """)
 
@@ -39,6 +141,74 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # 컬럼이 이미 존재
 
+    try:
+        cursor.execute("ALTER TABLE chat_logs ADD COLUMN thumb_url TEXT")
+    except sqlite3.OperationalError:
+        pass  # 컬럼이 이미 존재
+
+    # 마이그레이션: 방별 ID 순 조회(히스토리 페이지네이션)용 복합 인덱스
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_logs_room_id ON chat_logs (room, id)")
+
+    # message_reactions 테이블: 리액션 1개 = 1행, (msg_id, emoji, username) 유일
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_reactions'")
+    reactions_table_exists = cursor.fetchone() is not None
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS message_reactions (
+        msg_id INTEGER NOT NULL,
+        emoji TEXT NOT NULL,
+        username TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (msg_id, emoji, username)
+    ) WITHOUT ROWID
+    """)
+    if not reactions_table_exists:
+        _migrate_reaction_blobs(cursor)
+
+    _init_search(cursor)
+
+    # 업로드 파일: 내용(SHA-256)별 blob 1개 + 방별 파일 이름(/uploads/{room}/{name})마다 참조 1개
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_blobs (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_refs (
+        room TEXT NOT NULL,
+        name TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (room, name)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_refs_sha256 ON upload_refs (sha256)")
+
+    # 이어 올리기(청크) 업로드 세션과 받은 청크 번호
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        id TEXT PRIMARY KEY,
+        room TEXT NOT NULL,
+        username TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        chunk_size INTEGER NOT NULL,
+        sha256 TEXT,
+        state TEXT NOT NULL DEFAULT 'open',
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_chunks (
+        upload_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        PRIMARY KEY (upload_id, idx)
+    ) WITHOUT ROWID
+    """)
+
     # rooms 테이블 생성
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS rooms (
@@ -54,114 +224,315 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # 이미 존재
 
+    # 방별 보존 정책 (NULL이면 서버 기본값, 0이면 제한 없음)
+    for column in ("retention_max_age_days REAL", "retention_max_rows INTEGER"):
+        try:
+            cursor.execute(f"ALTER TABLE rooms ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass  # 이미 존재
+
+    # 보존 기간이 지나 압축 세그먼트로 옮긴 메시지의 ID 범위
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archive_segments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        room TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_segments_room ON archive_segments (room, last_id)")
+
+    # 삭제된 방의 기록·파일 정리 작업 (pending → running → done)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS room_deletions (
+        room TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'pending',
+        logs_total INTEGER NOT NULL DEFAULT 0,
+        logs_deleted INTEGER NOT NULL DEFAULT 0,
+        files_released INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """)
+
+    # 여러 워커 중 하나만 실행할 백그라운드 작업의 임대 (blob scan 등)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS job_leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+
     # rooms 테이블이 비어있으면 기본 방 추가
     cursor.execute("SELECT COUNT(*) FROM rooms")
     if cursor.fetchone()[0] == 0:
         cursor.execute("INSERT INTO rooms (name, password) VALUES (?, ?)", ("dev", "devpass123"))
         cursor.execute("INSERT INTO rooms (name, password) VALUES (?, ?)", ("general", "hello1234"))
 
-    conn.commit()
-    conn.close()
-
-def log_message(room: str, payload: Dict[str, Any]):
-    """채팅 메시지 페이로드를 데이터베이스에 저장합니다."""
-    msg_type = payload.get("type")
-    if msg_type not in ["chat", "file", "system"]:
+def _init_search(cursor: sqlite3.Cursor):
+    """chat_logs(message, filename)에 대한 FTS5 색인. chat/file 메시지만 트리거로 동기화합니다."""
+    global fts_available
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_logs_fts'")
+    fts_table_exists = cursor.fetchone() is not None
+    try:
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS chat_logs_fts USING fts5(
+            message, filename,
+            content = 'chat_logs', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        fts_available = False  # FTS5 없이 빌드된 SQLite
         return
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    INSERT INTO chat_logs (room, username, message, type, url, filename, color, reply_to_id)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    fts_available = True
+
+    triggers = (
+        f"""CREATE TRIGGER IF NOT EXISTS chat_logs_fts_ai AFTER INSERT ON chat_logs
+        WHEN new.type IN {_SEARCHABLE_TYPES} BEGIN
+            INSERT INTO chat_logs_fts (rowid, message, filename) VALUES (new.id, new.message, new.filename);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS chat_logs_fts_ad AFTER DELETE ON chat_logs
+        WHEN old.type IN {_SEARCHABLE_TYPES} BEGIN
+            INSERT INTO chat_logs_fts (chat_logs_fts, rowid, message, filename)
+            VALUES ('delete', old.id, old.message, old.filename);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS chat_logs_fts_au_old AFTER UPDATE OF message, filename, type ON chat_logs
+        WHEN old.type IN {_SEARCHABLE_TYPES} BEGIN
+            INSERT INTO chat_logs_fts (chat_logs_fts, rowid, message, filename)
+            VALUES ('delete', old.id, old.message, old.filename);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS chat_logs_fts_au_new AFTER UPDATE OF message, filename, type ON chat_logs
+        WHEN new.type IN {_SEARCHABLE_TYPES} BEGIN
+            INSERT INTO chat_logs_fts (rowid, message, filename) VALUES (new.id, new.message, new.filename);
+        END""",
+    )
+    for trigger in triggers:
+        cursor.execute(trigger)
+
+    # 마이그레이션: 색인이 새로 생겼으면 기존 메시지를 채워 넣음
+    if not fts_table_exists:
+        cursor.execute(f"""
+        INSERT INTO chat_logs_fts (rowid, message, filename)
+        SELECT id, message, filename FROM chat_logs WHERE type IN {_SEARCHABLE_TYPES}
+        """)
+
+def _message_row(room: str, payload: Dict[str, Any]) -> tuple:
+    return (
         room,
         payload.get("from", "system"),
         payload.get("message"),
-        msg_type,
+        payload.get("type"),
         payload.get("url"),
         payload.get("filename"),
         payload.get("color"),
-        payload.get("reply_to_id")
-    ))
+        payload.get("reply_to_id"),
+        payload.get("thumb_url")
+    )
+
+def log_message(room: str, payload: Dict[str, Any]):
+    """채팅 메시지 페이로드를 데이터베이스에 저장합니다."""
+    msg_type = payload.get("type")
+    if msg_type not in ["chat", "file", "system"]:
+        return
 
-    msg_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        cursor = conn.execute("""
+        INSERT INTO chat_logs (room, username, message, type, url, filename, color, reply_to_id, thumb_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, _message_row(room, payload))
+        msg_id = cursor.lastrowid
     return msg_id
 
+def log_messages(entries: List[tuple]) -> List[Tuple[int, int | None]]:
+    """
+    메시지들을 한 트랜잭션으로 저장하고 entries 순서대로 (메시지 ID, prev_id)를 반환합니다. (group commit)
+    entries: (msg_id, room, payload, timestamp) 튜플 목록. timestamp가 None이면 현재 시각.
+    msg_id가 None이면 커밋하는 트랜잭션 안에서 시퀀스로 ID를 매기므로 여러 프로세스가 써도
+    ID가 커밋 순서를 따르고, prev_id에 같은 방의 바로 앞 메시지 ID(없으면 0)를 돌려줍니다.
+    미리 ID를 할당한 행의 prev_id는 None입니다.
+    삭제 정리 중인 방의 행은 같은 트랜잭션 안에서 확인해 저장하지 않고 (None, None)을 돌려줍니다.
+    """
+    sql = """
+        INSERT INTO chat_logs (id, room, username, message, type, url, filename, color, reply_to_id, thumb_url, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        """
+    rows = [(msg_id, *_message_row(room, payload), ts) for msg_id, room, payload, ts in entries]
+    with _writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        deleting = _deleting_rooms(conn, {row[1] for row in rows})
+        kept = [row for row in rows if row[1] not in deleting]
+        if all(row[0] is not None for row in kept):
+            conn.executemany(sql, kept)
+            return [(None, None) if row[1] in deleting else (row[0], None) for row in rows]
+        result = []
+        for row in rows:
+            if row[1] in deleting:
+                result.append((None, None))
+                continue
+            msg_id = conn.execute(sql, row).lastrowid
+            prev = conn.execute("SELECT MAX(id) FROM chat_logs WHERE room = ? AND id < ?",
+                                (row[1], msg_id)).fetchone()[0]
+            result.append((msg_id, prev or 0))
+        return result
+
+def set_message_thumb(msg_id: int, thumb_url: str):
+    """파일 메시지에 나중에 만든 썸네일 주소를 기록합니다."""
+    with _writer() as conn:
+        conn.execute("UPDATE chat_logs SET thumb_url = ? WHERE id = ?", (thumb_url, msg_id))
+
+def reserve_message_ids(count: int) -> int:
+    """
+    chat_logs의 AUTOINCREMENT 시퀀스를 count만큼 앞당겨 ID 블록을 예약하고 첫 ID를 반환합니다.
+    시퀀스 갱신은 DB 잠금 안에서 이뤄지므로 여러 프로세스가 동시에 예약해도 겹치지 않습니다.
+    """
+    with _writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'chat_logs'").fetchone()
+        if row is None:
+            last = conn.execute("SELECT MAX(id) FROM chat_logs").fetchone()[0] or 0
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('chat_logs', ?)", (last + count,))
+        else:
+            last = row[0]
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'chat_logs'", (last + count,))
+    return last + 1
+
 def get_past_logs(room: str, limit: int = 50) -> List[Dict[str, Any]]:
     """특정 방의 과거 채팅 기록을 가져옵니다."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-    SELECT * FROM (
-        SELECT * FROM chat_logs WHERE room = ? ORDER BY timestamp DESC LIMIT ?
-    ) ORDER BY timestamp ASC
-    """, (room, limit))
-    
-    logs = cursor.fetchall()
-    conn.close()
-    
-    return [dict(log) for log in logs]
+    return get_logs_before(room, None, limit)
+
+def get_logs_before(room: str, before_id: int | None, limit: int = 50) -> List[Dict[str, Any]]:
+    """before_id보다 오래된 메시지를 최대 limit개, 오래된 순으로 가져옵니다. (keyset pagination)
+
+    DB에 남은 행이 모자라면 보관 세그먼트의 행을 합칩니다.
+    """
+    with _reader() as conn:
+        if before_id is None:
+            logs = conn.execute(
+                "SELECT * FROM chat_logs WHERE room = ? ORDER BY id DESC LIMIT ?",
+                (room, limit)).fetchall()
+        else:
+            logs = conn.execute(
+                "SELECT * FROM chat_logs WHERE room = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (room, before_id, limit)).fetchall()
+        logs = _with_reactions(conn, reversed(logs))
+        # 한 페이지가 다 찼으면 그보다 새로운 보관 행만 필요
+        floor = logs[0]["id"] if len(logs) >= limit else 0
+        archived = _archived_before(conn, room, before_id or _MAX_ID, limit, floor)
+    if not archived:
+        return logs
+    return sorted(logs + archived, key=lambda log: log["id"])[-limit:]
+
+def _archived_before(conn: sqlite3.Connection, room: str, before_id: int, limit: int,
+                     floor: int) -> List[Dict[str, Any]]:
+    """floor < id < before_id 범위의 보관 행 중 가장 새로운 limit개."""
+    segments = conn.execute("""
+        SELECT path, last_id FROM archive_segments
+        WHERE room = ? AND first_id < ? AND last_id > ? ORDER BY last_id DESC""",
+        (room, before_id, floor)).fetchall()
+    found: List[Dict[str, Any]] = []
+    for path, last_id in segments:
+        # 세그먼트는 새로운 것부터: 이미 limit개를 찾았고 이 세그먼트가 모두 그보다 오래됐으면 끝
+        if len(found) >= limit and last_id < found[limit - 1]["id"]:
+            break
+        found.extend(dict(row) for row in archive.read_segment(path) if floor < row["id"] < before_id)
+        found.sort(key=lambda log: log["id"], reverse=True)
+    return found[:limit]
+
+def get_logs_after(room: str, after_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+    """after_id 이후의 메시지를 최대 limit개, 오래된 순으로 가져옵니다. (재연결 시 delta 동기화)"""
+    with _reader() as conn:
+        logs = conn.execute(
+            "SELECT * FROM chat_logs WHERE room = ? AND id > ? ORDER BY id ASC LIMIT ?",
+            (room, after_id, limit)).fetchall()
+        return _with_reactions(conn, logs)
+
+# --- Search Functions ---
+
+def _fts_query(query: str) -> str:
+    """사용자 입력을 FTS5 쿼리로 변환합니다. 단어마다 따옴표로 감싸 접두어 검색, 모두 AND."""
+    terms = query.split()[:SEARCH_MAX_TERMS]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+def search_messages(room: str, query: str, before_id: int | None = None,
+                    limit: int = 20, sort: str = "recent") -> List[Dict[str, Any]] | None:
+    """방의 chat/file 메시지를 전문 검색합니다.
+
+    sort="recent"는 최신순(before_id로 다음 페이지), "relevance"는 bm25 순입니다.
+    snippet에는 일치 부분이 \\x02 ... \\x03 로 표시됩니다. FTS5를 쓸 수 없으면 None.
+    """
+    if not fts_available:
+        return None
+    match = _fts_query(query)
+    if not match:
+        return []
+    order = "rank, c.id DESC" if sort == "relevance" else "c.id DESC"
+    with _reader() as conn:
+        rows = conn.execute(f"""
+            SELECT c.id, c.username, c.message, c.timestamp, c.type, c.url, c.filename, c.color,
+                   snippet(chat_logs_fts, -1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(chat_logs_fts) AS rank
+            FROM chat_logs_fts JOIN chat_logs c ON c.id = chat_logs_fts.rowid
+            WHERE chat_logs_fts MATCH ? AND c.room = ? AND c.id < ?
+            ORDER BY {order} LIMIT ?
+            """, (match, room, before_id if before_id is not None else _MAX_ID, limit)).fetchall()
+    return [dict(row) for row in rows]
 
 # --- Room Management Functions ---
 
 def add_room(name: str, password: str):
     """새로운 방을 데이터베이스에 추가합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO rooms (name, password) VALUES (?, ?)", (name, password))
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        conn.execute("INSERT INTO rooms (name, password) VALUES (?, ?)", (name, password))
+    room_cache.put(name, password)
 
 def get_room_password(name: str) -> str | None:
     """방 이름으로 비밀번호를 조회합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT password FROM rooms WHERE name = ?", (name,))
-    result = cursor.fetchone()
-    conn.close()
+    if room_cache.loaded:
+        meta = room_cache.get(name)
+        return meta.password if meta else None
+    with _reader() as conn:
+        result = conn.execute("SELECT password FROM rooms WHERE name = ?", (name,)).fetchone()
     return result[0] if result else None
 
 def get_all_rooms() -> List[str]:
     """모든 방의 이름 목록을 조회합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM rooms")
-    rooms = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return rooms
+    if room_cache.loaded:
+        return room_cache.names()
+    with _reader() as conn:
+        return [row[0] for row in conn.execute("SELECT name FROM rooms").fetchall()]
 
 def delete_room_db(name: str):
-    """데이터베이스에서 방을 삭제합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM rooms WHERE name = ?", (name,))
-    conn.commit()
-    conn.close()
+    """데이터베이스에서 방을 삭제하고 남은 기록·파일 정리 작업(room_deletions)을 등록합니다."""
+    now = time.time()
+    with _writer() as conn:
+        conn.execute("DELETE FROM rooms WHERE name = ?", (name,))
+        total = conn.execute("SELECT COUNT(*) FROM chat_logs WHERE room = ?", (name,)).fetchone()[0]
+        conn.execute("""
+            INSERT OR REPLACE INTO room_deletions (room, status, logs_total, created_at, updated_at)
+            VALUES (?, 'pending', ?, ?, ?)""", (name, total, now, now))
+    room_cache.remove(name)
 
 def room_exists(name: str) -> bool:
     """방 존재 여부를 확인합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM rooms WHERE name = ?", (name,))
-    result = cursor.fetchone()
-    conn.close()
+    if room_cache.loaded:
+        return room_cache.get(name) is not None
+    with _reader() as conn:
+        result = conn.execute("SELECT 1 FROM rooms WHERE name = ?", (name,)).fetchone()
     return result is not None
 
 # --- Pinned Message Functions ---
 
 def set_pinned_message(room: str, msg_id: int | None):
     """방에 고정된 메시지를 설정하거나 해제합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE rooms SET pinned_message_id = ? WHERE name = ?", (msg_id, room))
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        conn.execute("UPDATE rooms SET pinned_message_id = ? WHERE name = ?", (msg_id, room))
+    room_cache.set_pinned(room, msg_id)
 
     # Also ensure legacy DBs are migrated if present
     try:
@@ -177,11 +548,11 @@ def set_pinned_message(room: str, msg_id: int | None):
 
 def get_pinned_message_id(room: str) -> int | None:
     """방의 고정 메시지 ID를 반환합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT pinned_message_id FROM rooms WHERE name = ?", (room,))
-    row = cursor.fetchone()
-    conn.close()
+    if room_cache.loaded:
+        meta = room_cache.get(room)
+        return meta.pinned_message_id if meta else None
+    with _reader() as conn:
+        row = conn.execute("SELECT pinned_message_id FROM rooms WHERE name = ?", (room,)).fetchone()
     if not row:
         return None
     return row[0]
@@ -189,64 +560,399 @@ def get_pinned_message_id(room: str) -> int | None:
 # --- Reaction Functions ---
 
 def add_reaction(msg_id: int, emoji: str, username: str):
-    """메시지에 리액션을 추가합니다."""
-    import json
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT reactions FROM chat_logs WHERE id = ?", (msg_id,))
-    result = cursor.fetchone()
-    if not result:
-        conn.close()
-        return
-
-    reactions = json.loads(result[0] or "{}")
-    if emoji not in reactions:
-        reactions[emoji] = []
-    if username not in reactions[emoji]:
-        reactions[emoji].append(username)
-
-    cursor.execute("UPDATE chat_logs SET reactions = ? WHERE id = ?",
-                   (json.dumps(reactions), msg_id))
-    conn.commit()
-    conn.close()
-    return reactions
+    """메시지에 리액션을 추가하고 그 메시지의 리액션 목록을 반환합니다."""
+    with _writer() as conn:
+        cursor = conn.execute("""
+        INSERT OR IGNORE INTO message_reactions (msg_id, emoji, username)
+        SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM chat_logs WHERE id = ?)
+        """, (msg_id, emoji, username, msg_id))
+        if cursor.rowcount == 0 and not _message_exists(conn, msg_id):
+            return
+        return _fetch_reactions(conn, [msg_id]).get(msg_id, {})
 
 def remove_reaction(msg_id: int, emoji: str, username: str):
-    """메시지에서 리액션을 제거합니다."""
-    import json
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT reactions FROM chat_logs WHERE id = ?", (msg_id,))
-    result = cursor.fetchone()
-    if not result:
-        conn.close()
-        return
-
-    reactions = json.loads(result[0] or "{}")
-    if emoji in reactions and username in reactions[emoji]:
-        reactions[emoji].remove(username)
-        if not reactions[emoji]:
-            del reactions[emoji]
-
-    cursor.execute("UPDATE chat_logs SET reactions = ? WHERE id = ?",
-                   (json.dumps(reactions), msg_id))
-    conn.commit()
-    conn.close()
-    return reactions
+    """메시지에서 리액션을 제거하고 그 메시지의 리액션 목록을 반환합니다."""
+    with _writer() as conn:
+        cursor = conn.execute(
+            "DELETE FROM message_reactions WHERE msg_id = ? AND emoji = ? AND username = ?",
+            (msg_id, emoji, username))
+        if cursor.rowcount == 0 and not _message_exists(conn, msg_id):
+            return
+        return _fetch_reactions(conn, [msg_id]).get(msg_id, {})
+
+def get_reactions(msg_ids: List[int]) -> Dict[int, Dict[str, List[str]]]:
+    """여러 메시지의 리액션을 한 번에 조회합니다. {msg_id: {emoji: [username, ...]}}"""
+    with _reader() as conn:
+        return _fetch_reactions(conn, msg_ids)
+
+def _message_exists(conn: sqlite3.Connection, msg_id: int) -> bool:
+    return conn.execute("SELECT 1 FROM chat_logs WHERE id = ?", (msg_id,)).fetchone() is not None
+
+def _fetch_reactions(conn: sqlite3.Connection, msg_ids) -> Dict[int, Dict[str, List[str]]]:
+    result: Dict[int, Dict[str, List[str]]] = {}
+    ids = list(dict.fromkeys(msg_ids))
+    for i in range(0, len(ids), 500):  # SQLite 바인딩 변수 개수 제한
+        chunk = ids[i:i + 500]
+        rows = conn.execute(f"""
+        SELECT msg_id, emoji, username FROM message_reactions
+        WHERE msg_id IN ({",".join("?" * len(chunk))})
+        ORDER BY msg_id, created_at
+        """, chunk).fetchall()
+        for msg_id, emoji, username in rows:
+            result.setdefault(msg_id, {}).setdefault(emoji, []).append(username)
+    return result
+
+def _with_reactions(conn: sqlite3.Connection, rows) -> List[Dict[str, Any]]:
+    """chat_logs 행들을 dict로 바꾸고 reactions에 집계된 리액션을 채웁니다."""
+    logs = [dict(row) for row in rows]
+    reactions = _fetch_reactions(conn, [log["id"] for log in logs])
+    for log in logs:
+        log["reactions"] = reactions.get(log["id"], {})
+    return logs
+
+def _migrate_reaction_blobs(cursor: sqlite3.Cursor):
+    """chat_logs.reactions JSON 문자열을 message_reactions 행으로 옮깁니다. (최초 1회)"""
+    rows = cursor.execute(
+        "SELECT id, reactions FROM chat_logs WHERE reactions IS NOT NULL AND reactions NOT IN ('', '{}')"
+    ).fetchall()
+    entries = []
+    for msg_id, blob in rows:
+        try:
+            reactions = json.loads(blob)
+        except ValueError:
+            continue
+        for emoji, users in (reactions or {}).items():
+            entries.extend((msg_id, emoji, user) for user in users)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO message_reactions (msg_id, emoji, username) VALUES (?, ?, ?)", entries)
 
 def get_message_by_id(msg_id: int) -> Dict[str, Any] | None:
-    """메시지 ID로 메시지를 조회합니다."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM chat_logs WHERE id = ?", (msg_id,))
-    result = cursor.fetchone()
-    conn.close()
-
-    return dict(result) if result else None
+    """메시지 ID로 메시지를 조회합니다. (보관 세그먼트로 옮긴 메시지 포함)"""
+    with _reader() as conn:
+        result = conn.execute("SELECT * FROM chat_logs WHERE id = ?", (msg_id,)).fetchone()
+        if result:
+            return _with_reactions(conn, [result])[0]
+        segments = conn.execute(
+            "SELECT path FROM archive_segments WHERE first_id <= ? AND last_id >= ?", (msg_id, msg_id)).fetchall()
+    for (path,) in segments:
+        for row in archive.read_segment(path):
+            if row["id"] == msg_id:
+                return dict(row)
+    return None
+
+# --- Upload Storage Functions ---
+
+def add_upload_ref(room: str, name: str, sha256: str, size: int,
+                   place: Callable[[], Any] | None = None) -> bool:
+    """방의 파일 이름을 blob에 연결하고 참조 수를 올립니다. 이미 있던 blob이면 True(중복 제거됨).
+
+    place는 blob 파일을 놓는 함수로, 쓰기 잠금(BEGIN IMMEDIATE)을 잡은 채 커밋 전에 실행합니다.
+    다른 프로세스의 remove_upload_refs도 같은 잠금 안에서 파일을 지우므로, 이미 있는 blob을 보고
+    임시 파일을 버린 직후 그 blob이 지워지는 일이 없습니다. place가 실패하면 참조도 롤백됩니다.
+    삭제 정리 중인 방이면 RoomDeletedError.
+    """
+    with _writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if _deleting_rooms(conn, {room}):
+            raise RoomDeletedError(room)
+        existed = conn.execute("SELECT 1 FROM upload_blobs WHERE sha256 = ?", (sha256,)).fetchone() is not None
+        conn.execute("INSERT OR IGNORE INTO upload_blobs (sha256, size) VALUES (?, ?)", (sha256, size))
+        cur = conn.execute("INSERT OR IGNORE INTO upload_refs (room, name, sha256) VALUES (?, ?, ?)",
+                           (room, name, sha256))
+        if cur.rowcount:
+            conn.execute("UPDATE upload_blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+        if place is not None:
+            place()
+    return existed
+
+def get_upload_ref(room: str, name: str) -> str | None:
+    """/uploads/{room}/{name}이 가리키는 blob의 SHA-256."""
+    with _reader() as conn:
+        row = conn.execute("SELECT sha256 FROM upload_refs WHERE room = ? AND name = ?", (room, name)).fetchone()
+    return row[0] if row else None
+
+def get_upload_refs(room: str) -> List[str]:
+    """방에 연결된 파일 이름 목록."""
+    with _reader() as conn:
+        return [row[0] for row in conn.execute("SELECT name FROM upload_refs WHERE room = ?", (room,))]
+
+def remove_upload_refs(room: str, names: List[str] | None = None,
+                       remove_blobs: Callable[[List[str]], Any] | None = None) -> List[str]:
+    """방의 파일 참조(names가 없으면 전부)를 지우고, 참조가 0이 되어 삭제한 blob의 SHA-256 목록을 반환합니다.
+
+    remove_blobs(orphans)는 쓰기 잠금 안에서 참조 수를 확인한 직후, 커밋 전에 blob 파일을 지웁니다.
+    """
+    with _writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if names is None:
+            rows = conn.execute("SELECT name, sha256 FROM upload_refs WHERE room = ?", (room,)).fetchall()
+        else:
+            rows = [row for name in names for row in conn.execute(
+                "SELECT name, sha256 FROM upload_refs WHERE room = ? AND name = ?", (room, name))]
+        released: Dict[str, int] = {}
+        for name, sha256 in rows:
+            conn.execute("DELETE FROM upload_refs WHERE room = ? AND name = ?", (room, name))
+            released[sha256] = released.get(sha256, 0) + 1
+        for sha256, count in released.items():
+            conn.execute("UPDATE upload_blobs SET refcount = refcount - ? WHERE sha256 = ?", (count, sha256))
+        orphans = [row[0] for row in conn.execute(
+            f"SELECT sha256 FROM upload_blobs WHERE refcount <= 0 AND sha256 IN ({','.join('?' * len(released))})",
+            list(released))] if released else []
+        conn.executemany("DELETE FROM upload_blobs WHERE sha256 = ?", [(sha,) for sha in orphans])
+        if orphans and remove_blobs is not None:
+            remove_blobs(orphans)
+    return orphans
+
+def claim_lease(name: str, owner: str, ttl: float) -> bool:
+    """작업 name을 owner가 ttl초 동안 맡습니다. 이미 맡은 owner면 연장하고, 다른 워커가 맡고 있으면 False."""
+    now = time.time()
+    with _writer() as conn:
+        cur = conn.execute("""
+            INSERT INTO job_leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE job_leases.owner = excluded.owner OR job_leases.expires_at < ?""",
+            (name, owner, now + ttl, now))
+    return cur.rowcount > 0
+
+def release_lease(name: str, owner: str):
+    with _writer() as conn:
+        conn.execute("DELETE FROM job_leases WHERE name = ? AND owner = ?", (name, owner))
+
+def get_room_upload_bytes(room: str) -> int:
+    """방에 올라간 파일 크기의 합 (다른 방과 공유하는 blob도 포함)."""
+    with _reader() as conn:
+        return conn.execute("""
+            SELECT COALESCE(SUM(b.size), 0) FROM upload_refs r JOIN upload_blobs b ON b.sha256 = r.sha256
+            WHERE r.room = ?""", (room,)).fetchone()[0]
+
+def get_upload_stats() -> Dict[str, int]:
+    with _reader() as conn:
+        blobs, stored, logical = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(size * refcount), 0) FROM upload_blobs").fetchone()
+        refs = conn.execute("SELECT COUNT(*) FROM upload_refs").fetchone()[0]
+    return {"blobs": blobs, "refs": refs, "stored_bytes": stored, "saved_bytes": logical - stored}
+
+# --- Chunked Upload Session Functions ---
+
+def create_upload_session(upload_id: str, room: str, username: str, filename: str,
+                          size: int, chunk_size: int, sha256: str | None, now: float):
+    with _writer() as conn:
+        conn.execute("""
+            INSERT INTO upload_sessions (id, room, username, filename, size, chunk_size, sha256, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (upload_id, room, username, filename, size, chunk_size, sha256, now, now))
+
+def get_upload_session(upload_id: str) -> Dict[str, Any] | None:
+    """세션 정보와 받은 청크 번호 목록(chunks)."""
+    with _reader() as conn:
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session["chunks"] = [r[0] for r in conn.execute(
+            "SELECT idx FROM upload_chunks WHERE upload_id = ? ORDER BY idx", (upload_id,))]
+    return session
+
+def add_upload_chunk(upload_id: str, idx: int, now: float) -> bool:
+    """받은 청크를 기록합니다. 세션이 없거나 완료 처리 중이면 False."""
+    with _writer() as conn:
+        cur = conn.execute("UPDATE upload_sessions SET updated_at = ? WHERE id = ? AND state = 'open'",
+                           (now, upload_id))
+        if not cur.rowcount:
+            return False
+        conn.execute("INSERT OR IGNORE INTO upload_chunks (upload_id, idx) VALUES (?, ?)", (upload_id, idx))
+    return True
+
+def set_upload_session_state(upload_id: str, state: str, expected: str) -> bool:
+    """state가 expected일 때만 바꿉니다. (완료 처리를 한 요청만 하도록)"""
+    with _writer() as conn:
+        cur = conn.execute("UPDATE upload_sessions SET state = ? WHERE id = ? AND state = ?",
+                           (state, upload_id, expected))
+    return cur.rowcount > 0
+
+def delete_upload_session(upload_id: str):
+    with _writer() as conn:
+        conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+
+def expire_upload_sessions(cutoff: float) -> List[str]:
+    """cutoff 이전에 마지막으로 갱신된 세션을 지우고 그 ID 목록을 반환합니다."""
+    with _writer() as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM upload_sessions WHERE updated_at < ?", (cutoff,))]
+        for upload_id in ids:
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    return ids
+
+# --- Retention / Archive Functions ---
+
+def get_retention_policies() -> List[tuple]:
+    """(방, max_age_days, max_rows) 목록. NULL은 서버 기본값을 쓴다는 뜻입니다."""
+    with _reader() as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT name, retention_max_age_days, retention_max_rows FROM rooms")]
+
+def set_retention_policy(room: str, max_age_days: float | None, max_rows: int | None) -> bool:
+    with _writer() as conn:
+        cur = conn.execute(
+            "UPDATE rooms SET retention_max_age_days = ?, retention_max_rows = ? WHERE name = ?",
+            (max_age_days, max_rows, room))
+    return cur.rowcount > 0
+
+def archive_room_logs(room: str, max_age_days: float, max_rows: int, batch: int = 1000) -> int:
+    """보존 정책을 넘긴 가장 오래된 메시지를 최대 batch개 세그먼트로 옮기고 그 수를 반환합니다.
+
+    오래된 쪽부터 연속된 행만 옮기므로 보관된 ID는 항상 남은 행보다 작습니다. (고정 메시지 제외)
+    세그먼트 압축·fsync는 쓰기 잠금 밖에서 하고, 트랜잭션 안에서는 읽은 행이 그대로인지
+    확인한 뒤 세그먼트 행 추가와 원본 삭제만 합니다. 그 사이 바뀌었으면(다른 워커가 옮김,
+    리액션·고정 변경) 세그먼트를 버리고 0을 반환하며 다음 실행에서 다시 시도합니다.
+    """
+    with _reader() as conn:
+        logs = _expired_logs(conn, room, max_age_days, max_rows, batch)
+    if not logs:
+        return 0
+    path = archive.write_segment(room, logs)
+    ids = [log["id"] for log in logs]
+    try:
+        with _writer() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # 여러 워커가 같은 행을 옮기지 않도록
+            if _expired_logs(conn, room, max_age_days, max_rows, batch)[:len(logs)] != logs:
+                archive.remove_segments([path])
+                return 0
+            conn.execute(
+                "INSERT INTO archive_segments (room, first_id, last_id, count, path) VALUES (?, ?, ?, ?, ?)",
+                (room, ids[0], ids[-1], len(ids), path))
+            for i in range(0, len(ids), 500):  # SQLite 바인딩 변수 개수 제한
+                chunk = ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM message_reactions WHERE msg_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM chat_logs WHERE id IN ({marks})", chunk)
+    except Exception:
+        archive.remove_segments([path])
+        raise
+    return len(logs)
+
+def _expired_logs(conn: sqlite3.Connection, room: str, max_age_days: float, max_rows: int,
+                  batch: int) -> List[Dict[str, Any]]:
+    """보존 정책을 넘긴 가장 오래된 연속 메시지(최대 batch개, 리액션 포함)."""
+    rows_cutoff = 0
+    if max_rows:
+        row = conn.execute("SELECT id FROM chat_logs WHERE room = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                           (room, max_rows)).fetchone()
+        rows_cutoff = row[0] if row else 0
+    age_cutoff = ""
+    if max_age_days:
+        age_cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{max_age_days} days",)).fetchone()[0]
+    pinned = conn.execute("SELECT pinned_message_id FROM rooms WHERE name = ?", (room,)).fetchone()
+    oldest = conn.execute(
+        "SELECT * FROM chat_logs WHERE room = ? AND id IS NOT ? ORDER BY id LIMIT ?",
+        (room, pinned[0] if pinned else None, batch)).fetchall()
+    expired = []
+    for row in oldest:
+        if row["id"] > rows_cutoff and not (row["timestamp"] and row["timestamp"] < age_cutoff):
+            break
+        expired.append(row)
+    return _with_reactions(conn, expired) if expired else []
+
+def get_archived_through(room: str) -> int | None:
+    """방에서 보관 세그먼트로 옮긴 가장 큰 메시지 ID. 보관된 메시지가 없으면 None."""
+    with _reader() as conn:
+        return conn.execute("SELECT MAX(last_id) FROM archive_segments WHERE room = ?", (room,)).fetchone()[0]
+
+def get_archive_stats(room: str | None = None) -> Dict[str, int]:
+    with _reader() as conn:
+        if room is None:
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM archive_segments").fetchone()
+        else:
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM archive_segments WHERE room = ?",
+                               (room,)).fetchone()
+    return {"segments": row[0], "rows": row[1]}
+
+def incremental_vacuum(pages: int) -> int:
+    """빈 페이지를 최대 pages개 파일에서 반환하고 그 수를 반환합니다. auto_vacuum=INCREMENTAL이 아니면 -1."""
+    with _writer() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return -1
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before:
+            # execute()는 이 pragma를 한 단계만 실행하므로(페이지 1개) executescript로 끝까지 실행
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+# --- Room Deletion Functions ---
+
+def get_room_deletion(room: str) -> Dict[str, Any] | None:
+    with _reader() as conn:
+        row = conn.execute("SELECT * FROM room_deletions WHERE room = ?", (room,)).fetchone()
+    return dict(row) if row else None
+
+def get_pending_room_deletions() -> List[str]:
+    with _reader() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT room FROM room_deletions WHERE status IN ('pending', 'running') ORDER BY created_at")]
+
+def claim_room_deletion(room: str, lease: float) -> bool:
+    """정리 작업을 이 워커가 맡습니다. 다른 워커가 lease초 넘게 갱신하지 않은 작업도 가져옵니다."""
+    now = time.time()
+    with _writer() as conn:
+        cur = conn.execute("""
+            UPDATE room_deletions SET status = 'running', updated_at = ?
+            WHERE room = ? AND (status = 'pending' OR (status = 'running' AND updated_at < ?))""",
+            (now, room, now - lease))
+    return cur.rowcount > 0
+
+def delete_room_logs_batch(room: str, batch: int) -> int:
+    """방의 메시지와 리액션을 최대 batch개 지우고 진행 상황을 갱신합니다. 지운 수를 반환."""
+    with _writer() as conn:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM chat_logs WHERE room = ? ORDER BY id LIMIT ?", (room, batch))]
+        for i in range(0, len(ids), 500):  # SQLite 바인딩 변수 개수 제한
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM message_reactions WHERE msg_id IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM chat_logs WHERE id IN ({marks})", chunk)
+        conn.execute("UPDATE room_deletions SET logs_deleted = logs_deleted + ?, updated_at = ? WHERE room = ?",
+                     (len(ids), time.time(), room))
+    return len(ids)
+
+def delete_room_archive(room: str) -> List[str]:
+    """방의 보관 세그먼트 기록을 지우고 세그먼트 파일 경로를 반환합니다."""
+    with _writer() as conn:
+        paths = [row[0] for row in conn.execute("SELECT path FROM archive_segments WHERE room = ?", (room,))]
+        conn.execute("DELETE FROM archive_segments WHERE room = ?", (room,))
+    return paths
+
+def finish_room_deletion(room: str, files_released: int = 0) -> bool:
+    """남은 메시지·업로드 참조가 없으면 같은 트랜잭션에서 정리 작업을 done으로 바꾸고 True.
+
+    남은 행이 있으면(정리 도중 끼어든 쓰기) 아무것도 바꾸지 않고 False를 반환하므로 다시 정리합니다.
+    """
+    with _writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        left = conn.execute("""
+            SELECT EXISTS (SELECT 1 FROM chat_logs WHERE room = ?)
+                OR EXISTS (SELECT 1 FROM upload_refs WHERE room = ?)""", (room, room)).fetchone()[0]
+        if left:
+            return False
+        conn.execute("""
+            UPDATE room_deletions SET status = 'done', files_released = files_released + ?, error = NULL,
+                updated_at = ? WHERE room = ?""", (files_released, time.time(), room))
+    return True
+
+def _deleting_rooms(conn: sqlite3.Connection, rooms) -> set:
+    """rooms 중 삭제 정리(pending/running)가 끝나지 않은 방."""
+    rooms = list(rooms)
+    if not rooms:
+        return set()
+    return {row[0] for row in conn.execute(f"""
+        SELECT room FROM room_deletions
+        WHERE status IN ('pending', 'running') AND room IN ({','.join('?' * len(rooms))})""", rooms)}
+
+def update_room_deletion(room: str, status: str, files_released: int = 0, error: str | None = None):
+    with _writer() as conn:
+        conn.execute("""
+            UPDATE room_deletions SET status = ?, files_released = files_released + ?, error = ?, updated_at = ?
+            WHERE room = ?""", (status, files_released, error, time.time(), room))
 
 # --- Schema Migration Helpers ---
 
@@ -258,32 +964,47 @@ def migrate_if_old_schema(db_path: str):
     """
     Ensure the SQLite database at db_path has all required columns.
     Adds missing columns for backward compatibility with older schemas.
-    - chat_logs: reply_to_id, reactions
+    - chat_logs: reply_to_id, reactions, thumb_url, (room, id) index
     - rooms: pinned_message_id
     """
+    if os.path.abspath(db_path) == os.path.abspath(DB_FILE):
+        # 메인 DB는 공유 쓰기 연결을 사용
+        with _writer() as conn:
+            _migrate_columns(conn)
+        return
+
     os.makedirs(os.path.dirname(db_path or '.'), exist_ok=True)
     conn = sqlite3.connect(db_path)
     try:
-        cur = conn.cursor()
-
-        # chat_logs table may be missing new columns in older DBs
-        try:
-            cols = _get_columns(conn, 'chat_logs')
-            if 'reply_to_id' not in cols:
-                cur.execute("ALTER TABLE chat_logs ADD COLUMN reply_to_id INTEGER")
-            if 'reactions' not in cols:
-                cur.execute("ALTER TABLE chat_logs ADD COLUMN reactions TEXT DEFAULT '{}' ")
-        except sqlite3.OperationalError:
-            pass
-
-        # rooms table: ensure pinned_message_id exists
-        try:
-            cols = _get_columns(conn, 'rooms')
-            if 'pinned_message_id' not in cols:
-                cur.execute("ALTER TABLE rooms ADD COLUMN pinned_message_id INTEGER")
-        except sqlite3.OperationalError:
-            pass
-
+        _migrate_columns(conn)
         conn.commit()
     finally:
         conn.close()
+
+def _migrate_columns(conn: sqlite3.Connection):
+    cur = conn.cursor()
+
+    # chat_logs table may be missing new columns in older DBs
+    try:
+        cols = _get_columns(conn, 'chat_logs')
+        if 'reply_to_id' not in cols:
+            cur.execute("ALTER TABLE chat_logs ADD COLUMN reply_to_id INTEGER")
+        if 'reactions' not in cols:
+            cur.execute("ALTER TABLE chat_logs ADD COLUMN reactions TEXT DEFAULT '{}' ")
+        if 'thumb_url' not in cols:
+            cur.execute("ALTER TABLE chat_logs ADD COLUMN thumb_url TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_logs_room_id ON chat_logs (room, id)")
+    except sqlite3.OperationalError:
+        pass
+
+    # rooms table: ensure pinned_message_id exists
+    try:
+        cols = _get_columns(conn, 'rooms')
+        if 'pinned_message_id' not in cols:
+            cur.execute("ALTER TABLE rooms ADD COLUMN pinned_message_id INTEGER")
+    except sqlite3.OperationalError:
+        pass
@@ -0,0 +1,145 @@
+"""Per-connection outbound queues
+
+broadcast()는 미리 인코딩한 프레임을 각 연결의 Outbox에 넣기만 하고, 실제 전송은
+연결마다 하나씩 있는 writer 태스크가 담당합니다. 느리거나 멈춘 클라이언트가
+다른 참여자의 수신을 지연시키지 않습니다.
+
+큐가 가득 찼을 때:
+  1) 버려도 되는 메시지(typing 등)는 새로 들어온 것부터 버리고, 큐 안의 것도 비워 자리를 만든다
+  2) 그래도 자리가 없으면 on_full 정책에 따라 연결을 끊거나("evict") 새 메시지를 버린다("drop")
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+ON_FULL_POLICIES = ("evict", "drop")
+SLOW_CONSUMER_CLOSE_CODE = 4003
+
+
+class FanoutStats:
+    __slots__ = ("enqueued", "sent", "dropped", "evicted", "send_failures")
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.send_failures = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+stats = FanoutStats()
+
+
+class Outbox:
+    def __init__(self, ws: WebSocket, maxsize: int = 256, on_full: str = "evict",
+                 droppable: Iterable[str] = ("typing",),
+                 on_close: Callable[[WebSocket], Any] | None = None):
+        if on_full not in ON_FULL_POLICIES:
+            raise ValueError(f"on_full must be one of {ON_FULL_POLICIES}")
+        self.ws = ws
+        self.maxsize = max(1, maxsize)
+        self.on_full = on_full
+        self.droppable = frozenset(droppable)
+        self.on_close = on_close
+        self.closed = False
+        self._queue: deque[Tuple[str | None, str]] = deque()  # (type, frame)
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def offer(self, frame: str, msg_type: str | None = None) -> bool:
+        """인코딩된 프레임을 큐에 넣습니다. 기다리지 않으며, 버려졌으면 False를 반환합니다."""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.maxsize and not self._make_room(msg_type):
+            return False
+        self._queue.append((msg_type, frame))
+        stats.enqueued += 1
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    async def drain(self, timeout: float = 1.0):
+        """큐가 빌 때까지(최대 timeout초) 기다립니다."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self):
+        """writer 태스크를 멈추고 남은 메시지를 버립니다."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def _make_room(self, msg_type: str | None) -> bool:
+        if msg_type in self.droppable:
+            stats.dropped += 1
+            return False
+        # 큐에 쌓인 버려도 되는 메시지부터 정리
+        kept = deque(item for item in self._queue if item[0] not in self.droppable)
+        stats.dropped += len(self._queue) - len(kept)
+        self._queue = kept
+        if len(self._queue) < self.maxsize:
+            return True
+        if self.on_full == "drop":
+            stats.dropped += 1
+            return False
+        stats.evicted += 1
+        logger.info("fanout: evicting slow consumer (queue depth %d)", len(self._queue))
+        self._shutdown(SLOW_CONSUMER_CLOSE_CODE)
+        return False
+
+    def _shutdown(self, code: int | None = None):
+        self.close()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+        if self.on_close is not None:
+            result = self.on_close(self.ws)
+            if asyncio.iscoroutine(result):
+                asyncio.create_task(result)
+
+    async def _close_socket(self, code: int):
+        try:
+            await asyncio.wait_for(self.ws.close(code=code), timeout=1.0)
+        except Exception:
+            pass
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._idle.set()
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, frame = self._queue.popleft()
+                await self.ws.send_text(frame)
+                stats.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            stats.send_failures += 1
+            if not self.closed:
+                self._shutdown()
@@ -0,0 +1,55 @@
+"""WebSocket text frame encoding
+
+브로드캐스트할 페이로드는 한 번만 JSON으로 인코딩하고, 같은 문자열 프레임을
+모든 수신자에게 보냅니다. JSON 백엔드는 교체할 수 있으며 기본값(auto)은
+orjson이 설치되어 있으면 orjson, 없으면 표준 json입니다.
+
+  JSON_BACKEND=auto | orjson | json
+"""
+import json
+import os
+from typing import Any, Callable, Dict
+
+Encoder = Callable[[Any], str]
+
+_backends: Dict[str, Encoder] = {}
+
+
+def register_backend(name: str, encoder: Encoder):
+    """payload → str 인코더를 등록합니다."""
+    _backends[name] = encoder
+
+
+def _json_encode(payload: Any) -> str:
+    # starlette의 send_json()과 같은 형식
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+register_backend("json", _json_encode)
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+else:
+    def _orjson_encode(payload: Any) -> str:
+        return orjson.dumps(payload).decode("utf-8")
+
+    register_backend("orjson", _orjson_encode)
+
+
+backend_name = ""
+encode: Encoder = _json_encode
+
+
+def use_backend(name: str):
+    """사용할 JSON 백엔드를 선택합니다. "auto"는 가능한 가장 빠른 백엔드."""
+    global backend_name, encode
+    if name == "auto":
+        name = "orjson" if "orjson" in _backends else "json"
+    if name not in _backends:
+        raise ValueError(f"unknown JSON backend: {name} (available: {', '.join(sorted(_backends))})")
+    backend_name, encode = name, _backends[name]
+
+
+use_backend(os.environ.get("JSON_BACKEND", "auto"))
@@ -0,0 +1,196 @@
+"""In-memory ring buffer of recent messages per room
+
+활발한 방의 최근 메시지 페이로드(클라이언트로 보내는 형식 그대로)를 방별로
+일정 개수만 보관합니다. broadcast / 리액션 / 고정 메시지 변경 시 갱신되며,
+입장 history, 재연결 delta, 고정 메시지 조회를 SQLite 대신 여기서 처리합니다.
+
+각 방 버퍼는 floor_id를 가집니다: "id > floor_id 인 그 방의 메시지는 모두 버퍼에 있다".
+floor_id == 0 이면 방의 전체 기록이 버퍼에 들어 있다는 뜻입니다.
+
+한 방의 개수 상한(per_room)과 전체 메모리 상한(max_bytes, 인코딩된 프레임 크기 기준)을
+넘으면 가장 오래 쓰이지 않은 방부터 통째로 버립니다. (LRU)
+"""
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Tuple
+
+_UNKNOWN = object()
+
+
+class _RoomBuffer:
+    __slots__ = ("messages", "sizes", "bytes", "floor_id", "pinned")
+
+    def __init__(self, floor_id: int):
+        self.messages: deque = deque()
+        self.sizes: deque = deque()
+        self.bytes = 0
+        self.floor_id = floor_id
+        self.pinned: Any = _UNKNOWN  # pin_update 페이로드, None(고정 없음) 또는 _UNKNOWN
+
+
+class RecentMessages:
+    def __init__(self, per_room: int = 200, max_bytes: int = 32 * 1024 * 1024):
+        self.per_room = max(1, per_room)
+        self.max_bytes = max(1, max_bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rooms: "OrderedDict[str, _RoomBuffer]" = OrderedDict()
+
+    # --- 조회 ---
+
+    def latest(self, room: str, limit: int) -> Tuple[List[Dict[str, Any]], bool] | None:
+        """최근 limit개와 has_more를 반환합니다. 버퍼로 답할 수 없으면 None."""
+        buf = self._touch(room)
+        if buf is None or (len(buf.messages) < limit and buf.floor_id != 0):
+            self.misses += 1
+            return None
+        self.hits += 1
+        messages = list(buf.messages)[-limit:] if limit else []
+        has_more = len(buf.messages) > limit or buf.floor_id != 0
+        return messages, has_more
+
+    def since(self, room: str, last_id: int) -> List[Dict[str, Any]] | None:
+        """last_id 이후 메시지를 모두 반환합니다. 버퍼가 그 구간을 다 갖고 있지 않으면 None."""
+        buf = self._touch(room)
+        if buf is None or last_id < buf.floor_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [m for m in buf.messages if m.get("id", 0) > last_id]
+
+    def get(self, room: str, msg_id: int) -> Dict[str, Any] | None:
+        buf = self._touch(room)
+        if buf is not None:
+            for m in reversed(buf.messages):
+                if m.get("id") == msg_id:
+                    self.hits += 1
+                    return m
+        self.misses += 1
+        return None
+
+    def pinned(self, room: str) -> Tuple[bool, Dict[str, Any] | None]:
+        """(캐시 여부, pin_update 페이로드 또는 None)을 반환합니다."""
+        buf = self._touch(room)
+        if buf is None or buf.pinned is _UNKNOWN:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, buf.pinned
+
+    # --- 갱신 ---
+
+    def load(self, room: str, messages: List[Dict[str, Any]], sizes: List[int], complete: bool):
+        """DB에서 읽은 최근 메시지로 버퍼를 채웁니다. complete=True면 방의 전체 기록."""
+        old = self._rooms.pop(room, None)
+        if old is not None:
+            self.total_bytes -= old.bytes
+        if complete or not messages:
+            floor_id = 0 if complete else (old.floor_id if old else 0)
+        else:
+            floor_id = messages[0]["id"] - 1
+        buf = _RoomBuffer(floor_id)
+        if old is not None:
+            buf.pinned = old.pinned
+        self._rooms[room] = buf
+        last_id = messages[-1]["id"] if messages else 0
+        for payload, size in zip(messages, sizes):
+            self._push(buf, payload, size)
+        # 읽는 동안 broadcast로 들어온 메시지는 유지
+        if old is not None:
+            for payload, size in zip(old.messages, old.sizes):
+                if payload.get("id", 0) > last_id:
+                    self._push(buf, payload, size)
+        self._enforce_cap()
+
+    def append(self, room: str, payload: Dict[str, Any], size: int):
+        """broadcast된 메시지를 추가합니다. 처음 보는 방이면 이 메시지부터 버퍼를 시작합니다."""
+        msg_id = payload.get("id")
+        if not msg_id:
+            return
+        buf = self._touch(room)
+        if buf is None:
+            buf = self._rooms[room] = _RoomBuffer(msg_id - 1)
+        if buf.messages and msg_id < buf.messages[-1].get("id", 0):
+            # 다른 워커의 메시지가 늦게 도착한 경우: id 순서를 유지
+            if msg_id <= buf.floor_id:
+                return
+            pos = len(buf.messages)
+            while pos > 0 and buf.messages[pos - 1].get("id", 0) > msg_id:
+                pos -= 1
+            buf.messages.insert(pos, payload)
+            buf.sizes.insert(pos, size)
+            buf.bytes += size
+            self.total_bytes += size
+            self._trim(buf)
+        else:
+            self._push(buf, payload, size)
+        self._enforce_cap()
+
+    def update_reactions(self, room: str, msg_id: int, reactions: Dict[str, Any] | None):
+        buf = self._rooms.get(room)
+        if buf is None:
+            return
+        for m in reversed(buf.messages):
+            if m.get("id") == msg_id:
+                m["reactions"] = reactions or {}
+                return
+
+    def update_thumb(self, room: str, msg_id: int, thumb_url: str):
+        buf = self._rooms.get(room)
+        if buf is None:
+            return
+        for m in reversed(buf.messages):
+            if m.get("id") == msg_id:
+                m["thumb_url"] = thumb_url
+                return
+
+    def set_pinned(self, room: str, pinned: Dict[str, Any] | None):
+        buf = self._rooms.get(room)
+        if buf is not None:
+            buf.pinned = pinned
+
+    def drop(self, room: str):
+        buf = self._rooms.pop(room, None)
+        if buf is not None:
+            self.total_bytes -= buf.bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rooms": len(self._rooms),
+            "messages": sum(len(b.messages) for b in self._rooms.values()),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    # --- 내부 ---
+
+    def _touch(self, room: str) -> _RoomBuffer | None:
+        buf = self._rooms.get(room)
+        if buf is not None:
+            self._rooms.move_to_end(room)
+        return buf
+
+    def _push(self, buf: _RoomBuffer, payload: Dict[str, Any], size: int):
+        buf.messages.append(payload)
+        buf.sizes.append(size)
+        buf.bytes += size
+        self.total_bytes += size
+        self._trim(buf)
+
+    def _trim(self, buf: _RoomBuffer):
+        while len(buf.messages) > self.per_room:
+            evicted = buf.messages.popleft()
+            evicted_size = buf.sizes.popleft()
+            buf.bytes -= evicted_size
+            self.total_bytes -= evicted_size
+            buf.floor_id = evicted.get("id", buf.floor_id)
+
+    def _enforce_cap(self):
+        # 가장 최근에 쓴 방 하나는 남겨 둔다
+        while self.total_bytes > self.max_bytes and len(self._rooms) > 1:
+            _, buf = self._rooms.popitem(last=False)
+            self.total_bytes -= buf.bytes
+            self.evictions += 1
@@ -0,0 +1,161 @@
+"""Write-behind message journal
+
+broadcast()가 저장할 메시지를 메모리 큐에 넣으면, 백그라운드 writer가
+N개 또는 T밀리초마다 한 트랜잭션으로 모아서 저장합니다. (group commit)
+메시지 ID는 DB에서 미리 예약한 블록에서 즉시 할당되므로 브로드캐스트 전에 알 수 있습니다.
+
+여러 프로세스가 같은 DB에 쓰면(ids_at_commit=True) 워커마다 다른 블록을 쓰게 되어 ID가
+보낸 순서와 어긋나므로, 이때는 커밋하는 트랜잭션 안에서 SQLite 시퀀스로 ID를 매기고
+append()는 커밋을 기다린 뒤 그 ID를 반환합니다. (durability와 관계없이 ack-after-commit)
+payload에는 prev_id(같은 방의 바로 앞 메시지 ID)를 채워, 받는 쪽이 워커 사이에서 순서가
+뒤바뀐 메시지를 ID 순서대로 전달할 수 있게 합니다. (server.deliver → DeliveryOrder)
+
+durability:
+  - "commit"  : 배치가 커밋된 뒤에 append()가 반환 (ack-after-commit)
+  - "enqueue" : 큐에 넣자마자 반환 (ack-after-enqueue, 서버가 죽으면 최대 한 배치 유실)
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from . import async_db
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("commit", "enqueue")
+LOGGED_TYPES = ("chat", "file", "system")
+
+
+def _db_timestamp(ts: str | None) -> str | None:
+    # ISO 8601 → SQLite CURRENT_TIMESTAMP 형식 ("YYYY-MM-DD HH:MM:SS", UTC)
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+class MessageJournal:
+    def __init__(self, batch_size: int = 64, flush_ms: int = 20,
+                 durability: str = "commit", id_block: int = 256, ids_at_commit: bool = False):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0, flush_ms) / 1000
+        self.durability = durability
+        self.id_block = max(1, id_block)
+        self.ids_at_commit = ids_at_commit
+
+        self._pending: List[Tuple[tuple | None, asyncio.Future | None]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._full: asyncio.Event | None = None
+        self._id_lock: asyncio.Lock | None = None
+        self._next_id = 0
+        self._id_end = 0  # 예약된 블록의 끝 (exclusive)
+        self._inflight = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._task is None:
+            # 이벤트 루프에 묶이는 객체는 시작 시점에 생성
+            self._wakeup, self._full, self._id_lock = asyncio.Event(), asyncio.Event(), asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """남은 메시지를 모두 저장하고 writer를 종료합니다."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def append(self, room: str, payload: Dict[str, Any]) -> int | None:
+        """메시지를 저널에 넣고 할당된 메시지 ID를 반환합니다."""
+        if payload.get("type") not in LOGGED_TYPES:
+            return None
+        if self._task is None:
+            raise RuntimeError("journal is not started")
+        msg_id = None if self.ids_at_commit else await self._allocate_id()
+        entry = (msg_id, room, dict(payload), _db_timestamp(payload.get("timestamp")))
+        if self.durability == "commit" or msg_id is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._enqueue(entry, fut)
+            msg_id, prev_id = await fut
+            if prev_id is not None:
+                payload["prev_id"] = prev_id
+            return msg_id
+        self._enqueue(entry, None)
+        return msg_id
+
+    async def flush(self):
+        """지금까지 넣은 메시지가 모두 커밋될 때까지 기다립니다."""
+        if self._task is None or (not self._pending and not self._inflight):
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._enqueue(None, fut)
+        self._full.set()  # 배치를 기다리지 않고 바로 저장
+        await fut
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    async def _allocate_id(self) -> int:
+        if self._next_id >= self._id_end:
+            async with self._id_lock:
+                if self._next_id >= self._id_end:
+                    start = await async_db.reserve_message_ids(self.id_block)
+                    self._next_id, self._id_end = start, start + self.id_block
+        msg_id = self._next_id
+        self._next_id += 1
+        return msg_id
+
+    def _enqueue(self, entry: tuple | None, fut: asyncio.Future | None):
+        self._pending.append((entry, fut))
+        self._wakeup.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._full.is_set() and self.flush_interval:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            if not self._pending:
+                self._wakeup.clear()
+            if len(self._pending) < self.batch_size and all(e is not None for e, _ in self._pending):
+                self._full.clear()
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[tuple | None, asyncio.Future | None]]):
+        entries = [entry for entry, _ in batch if entry is not None]
+        ids: List[Tuple[int, int | None]] = []
+        error: Exception | None = None
+        self._inflight = True
+        try:
+            if entries:
+                ids = await async_db.log_messages(entries)
+        except Exception as e:
+            error = e
+            logger.exception("journal: failed to write %d message(s)", len(entries))
+        finally:
+            self._inflight = False
+        ids_iter = iter(ids)
+        for entry, fut in batch:
+            result = next(ids_iter, None) if entry is not None else None
+            if fut is None or fut.done():
+                continue
+            if error is not None and entry is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
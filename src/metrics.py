@@ -0,0 +1,162 @@
+"""Prometheus text-format metrics
+
+외부 라이브러리 없이 /metrics에 필요한 만큼만 구현합니다. 모든 갱신은 이벤트 루프
+스레드에서 하므로 잠금이 없고, 히스토그램 관측은 bisect 한 번과 리스트 증가 두 번입니다.
+이미 다른 모듈이 세고 있는 값(fanout, 업로드 통계 등)은 복사하지 않고 scrape할 때
+콜백으로 읽습니다.
+
+  - Counter    : 누적 값. 레이블별로 따로 셈
+  - Histogram  : 고정 버킷 분포 (_bucket / _sum / _count)
+  - Callback   : scrape 시 fn()을 불러 값을 읽음 (gauge 또는 counter)
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 초 단위 지연 시간 버킷 (0.1ms ~ 5s)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Samples = Iterable[Tuple[str, Tuple[str, ...], float]]  # (접미사, 레이블 값, 값)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def samples(self) -> Samples:
+        return ()
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for suffix, values, value in self.samples():
+            names = self.labels + (("le",) if suffix == "_bucket" else ())
+            out.append(f"{self.name}{suffix}{_labels(names, values)} {_number(value)}")
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def samples(self) -> Samples:
+        for values, value in sorted(self._values.items()):
+            yield "", values, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # 레이블 -> [버킷별 개수..., +Inf, sum]
+
+    def observe(self, value: float, *values: str):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Samples:
+        for values, series in sorted(self._series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                total += count
+                yield "_bucket", values + ("+Inf" if bound == float("inf") else _number(bound),), total
+            yield "_sum", values, series[-1]
+            yield "_count", values, total
+
+
+class Callback(_Metric):
+    """fn()이 숫자 또는 {레이블 값 튜플: 숫자}를 반환합니다."""
+
+    def __init__(self, name: str, help: str, fn: Callable, kind: str = "gauge",
+                 labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> Samples:
+        value = self.fn()
+        if isinstance(value, dict):
+            for values, v in sorted(value.items()):
+                yield "", values, v
+        else:
+            yield "", (), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge_fn(self, name: str, help: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self.register(Callback(name, help, fn, "gauge", labels))
+
+    def counter_fn(self, name: str, help: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self.register(Callback(name, help, fn, "counter", labels))
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics.values():
+            metric.render(out)
+        return "\n".join(out) + "\n"
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = (f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = Registry()
+
+# --- 여러 모듈에서 쓰는 지표 ---
+
+db_seconds = registry.histogram(
+    "webchat_db_seconds", "Time spent running each database.py function on the DB thread pool.",
+    ("function",))
+db_wait_seconds = registry.histogram(
+    "webchat_db_wait_seconds", "Time DB calls waited for a free DB thread.")
+upload_bytes = registry.counter(
+    "webchat_upload_bytes_total", "Bytes of completed uploads.", ("kind",))
+upload_throughput = registry.histogram(
+    "webchat_upload_throughput_mbps", "Per-upload receive throughput in MB/s.", ("kind",),
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500))
@@ -0,0 +1,80 @@
+"""Per-room delivery order across workers
+
+여러 워커가 같은 방에 쓰면 메시지 ID는 커밋 순서를 따르지만, 자기 워커의 메시지는 바로,
+다른 워커의 메시지는 backplane poll 뒤에 도착하므로 전달 순서가 ID 순서와 어긋날 수
+있습니다. 클라이언트는 받은 가장 큰 ID부터 delta 동기화하므로 그대로 보내면 중간 메시지를
+놓칠 수 있습니다.
+
+저널은 각 메시지에 prev_id(같은 방의 바로 앞 메시지 ID)를 붙입니다. DeliveryOrder는 방별로
+마지막으로 전달한 ID를 기억하고, 앞 메시지가 아직 오지 않은 메시지는 잠시 붙잡아 두었다가
+앞 메시지가 오면 이어서 전달합니다. max_wait 안에 오지 않으면(보낸 워커가 죽는 등) 붙잡아 둔
+메시지를 ID 순서대로 그냥 전달합니다. prev_id가 없는 메시지(단일 워커, ID 없는 이벤트)는
+바로 전달합니다.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+Send = Callable[[str, Dict[str, Any], str], Awaitable[None]]
+
+
+class DeliveryOrder:
+    def __init__(self, send: Send, max_wait: float = 1.0):
+        self.send = send
+        self.max_wait = max_wait
+        self.held_total = 0  # 앞 메시지를 기다리느라 붙잡았던 메시지 수
+        self.timeouts = 0    # 기다리다 포기하고 전달한 횟수
+        self._last: Dict[str, int] = {}  # room -> 마지막으로 전달한 메시지 ID
+        self._held: Dict[str, Dict[int, Tuple[Dict[str, Any], str]]] = {}  # room -> prev_id -> (payload, origin)
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def push(self, room: str, payload: Dict[str, Any], origin: str):
+        msg_id, prev_id = payload.get("id"), payload.get("prev_id")
+        last = self._last.get(room)
+        if not msg_id or prev_id is None or last is None or prev_id <= last:
+            await self._deliver(room, payload, origin)
+            return
+        self._held.setdefault(room, {})[prev_id] = (payload, origin)
+        self.held_total += 1
+        if room not in self._timers:
+            self._timers[room] = asyncio.get_running_loop().call_later(
+                self.max_wait, lambda: asyncio.create_task(self._give_up(room)))
+
+    def drop(self, room: str):
+        self._last.pop(room, None)
+        self._held.pop(room, None)
+        timer = self._timers.pop(room, None)
+        if timer is not None:
+            timer.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"held": sum(len(h) for h in self._held.values()),
+                "held_total": self.held_total, "timeouts": self.timeouts}
+
+    async def _deliver(self, room: str, payload: Dict[str, Any], origin: str):
+        await self.send(room, payload, origin)
+        msg_id = payload.get("id")
+        if not msg_id:
+            return
+        self._last[room] = max(msg_id, self._last.get(room, 0))
+        held = self._held.get(room)
+        while held and self._last[room] in held:
+            payload, origin = held.pop(self._last[room])
+            await self.send(room, payload, origin)
+            self._last[room] = max(payload["id"], self._last[room])
+        if not held:
+            self._clear(room)
+
+    async def _give_up(self, room: str):
+        self._timers.pop(room, None)
+        held = self._held.pop(room, None)
+        if not held:
+            return
+        self.timeouts += 1
+        for payload, origin in sorted(held.values(), key=lambda item: item[0]["id"]):
+            await self._deliver(room, payload, origin)
+
+    def _clear(self, room: str):
+        self._held.pop(room, None)
+        timer = self._timers.pop(room, None)
+        if timer is not None:
+            timer.cancel()
@@ -0,0 +1,107 @@
+"""Retention policy job
+
+interval마다 방별 보존 정책(최대 기간·최대 행 수)을 넘긴 메시지를 archive 세그먼트로
+옮긴 뒤, 비워진 DB 페이지를 incremental vacuum으로 조금씩 반환합니다. 한 번에 batch개씩
+옮기고 vacuum도 vacuum_pages씩 나눠서 하므로 쓰기 잠금을 오래 잡지 않습니다.
+
+방 설정이 NULL이면 서버 기본값(default_max_age_days, default_max_rows)을 쓰고, 0은 제한 없음입니다.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from . import async_db
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    def __init__(self, interval: float = 3600.0, batch: int = 1000,
+                 default_max_age_days: float = 0, default_max_rows: int = 0,
+                 vacuum_pages: int = 256):
+        self.interval = interval
+        self.batch = max(1, batch)
+        self.default_max_age_days = default_max_age_days
+        self.default_max_rows = default_max_rows
+        self.vacuum_pages = vacuum_pages
+        self.runs = 0
+        self.archived = 0
+        self.vacuumed_pages = 0
+        self.last_run_seconds = 0.0
+        self.vacuum_enabled: bool | None = None  # 첫 vacuum 시도 후 결정
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def policy(self, max_age_days: float | None, max_rows: int | None) -> Dict[str, Any]:
+        """방 설정에 기본값을 적용한 실제 정책."""
+        return {
+            "max_age_days": self.default_max_age_days if max_age_days is None else max_age_days,
+            "max_rows": self.default_max_rows if max_rows is None else max_rows,
+        }
+
+    async def run_once(self) -> int:
+        started = time.monotonic()
+        archived = 0
+        for room, max_age_days, max_rows in await async_db.get_retention_policies():
+            policy = self.policy(max_age_days, max_rows)
+            if not policy["max_age_days"] and not policy["max_rows"]:
+                continue
+            while True:
+                moved = await async_db.archive_room_logs(
+                    room, policy["max_age_days"], policy["max_rows"], self.batch)
+                archived += moved
+                if moved < self.batch:
+                    break
+                await asyncio.sleep(0)  # 배치 사이에 다른 쓰기가 들어올 수 있게
+        self.archived += archived
+        if archived:
+            await self.vacuum()
+        self.runs += 1
+        self.last_run_seconds = time.monotonic() - started
+        return archived
+
+    async def vacuum(self):
+        while self.vacuum_enabled is not False:
+            freed = await async_db.incremental_vacuum(self.vacuum_pages)
+            if freed < 0:
+                # 기존 DB는 auto_vacuum=NONE: 서버를 멈추고 한 번 VACUUM해야 전환됨
+                logger.info("retention: incremental vacuum unavailable (auto_vacuum is not INCREMENTAL)")
+                self.vacuum_enabled = False
+                return
+            self.vacuum_enabled = True
+            self.vacuumed_pages += freed
+            if freed < self.vacuum_pages:
+                return
+            await asyncio.sleep(0.05)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_max_age_days": self.default_max_age_days,
+            "default_max_rows": self.default_max_rows,
+            "runs": self.runs,
+            "archived": self.archived,
+            "vacuumed_pages": self.vacuumed_pages,
+            "vacuum_enabled": self.vacuum_enabled,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("retention: run failed")
+            await asyncio.sleep(self.interval)
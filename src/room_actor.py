@@ -0,0 +1,149 @@
+"""Per-room actor tasks
+
+활성 방마다 inbox(큐)와 그것을 처리하는 태스크 하나를 둡니다. 그 방의 메시지
+브로드캐스트, 리액션, 고정 메시지, 닉네임 변경은 모두 inbox를 거쳐 도착 순서대로
+처리되므로 DB 저장 순서와 전송 순서가 같고, 같은 방의 갱신끼리 경합하지 않습니다.
+
+inbox 항목:
+  - dict     : 브로드캐스트할 페이로드. 연속된 페이로드는 모아서 publish_batch로 한 번에 처리
+  - callable : 순서를 지켜 실행할 작업(async 함수). 작업 안에서는 broadcast 대신
+               publish_batch를 직접 불러야 합니다 (같은 inbox를 기다리면 교착)
+
+idle_timeout 동안 할 일이 없으면 태스크가 스스로 종료되고, 다음 항목이 오면 다시 생깁니다.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PublishBatch = Callable[[str, List[Dict[str, Any]]], Awaitable[None]]
+
+
+class RoomActor:
+    __slots__ = ("room", "inbox", "task")
+
+    def __init__(self, room: str, inbox_max: int):
+        self.room = room
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=inbox_max)
+        self.task: asyncio.Task | None = None
+
+
+class RoomActors:
+    def __init__(self, idle_timeout: float = 30.0, max_batch: int = 64, inbox_max: int = 1024):
+        self.publish_batch: PublishBatch | None = None
+        self.idle_timeout = idle_timeout
+        self.max_batch = max(1, max_batch)
+        self.inbox_max = max(1, inbox_max)
+        self.started = 0   # 생성한 actor 수
+        self.stopped = 0   # idle로 종료한 actor 수
+        self.processed = 0
+        self.batches = 0
+        self._actors: Dict[str, RoomActor] = {}
+
+    def start(self, publish_batch: PublishBatch):
+        self.publish_batch = publish_batch
+
+    async def submit(self, room: str, item: Dict[str, Any] | Callable[[], Awaitable[Any]]) -> Any:
+        """항목을 방 inbox에 넣고 처리될 때까지 기다립니다. inbox가 가득 차면 여기서 대기(backpressure)."""
+        if self.publish_batch is None:
+            raise RuntimeError("room actors are not started")
+        actor = self._actors.get(room)
+        if actor is None:
+            actor = self._actors[room] = RoomActor(room, self.inbox_max)
+            actor.task = asyncio.create_task(self._run(actor))
+            self.started += 1
+        fut = asyncio.get_running_loop().create_future()
+        await actor.inbox.put((item, fut))
+        return await fut
+
+    async def stop(self, timeout: float = 5.0):
+        """남은 항목을 처리할 시간을 준 뒤 모든 actor를 종료합니다."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while any(not a.inbox.empty() for a in self._actors.values()) and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        for actor in list(self._actors.values()):
+            actor.task.cancel()
+            try:
+                await actor.task
+            except asyncio.CancelledError:
+                pass
+            while not actor.inbox.empty():
+                _, fut = actor.inbox.get_nowait()
+                if not fut.done():
+                    fut.cancel()
+        self._actors.clear()
+
+    def inbox_depths(self) -> Dict[str, int]:
+        return {room: actor.inbox.qsize() for room, actor in self._actors.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        depths = self.inbox_depths()
+        return {
+            "active": len(self._actors),
+            "started": self.started,
+            "stopped": self.stopped,
+            "processed": self.processed,
+            "batches": self.batches,
+            "inbox_depth_max": max(depths.values(), default=0),
+            "inbox_depth": {room: d for room, d in depths.items() if d},
+        }
+
+    async def _run(self, actor: RoomActor):
+        while True:
+            try:
+                first = await asyncio.wait_for(actor.inbox.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if actor.inbox.empty():
+                    # 같은 이벤트 루프 단계에서 제거하므로 그 사이에 들어오는 항목은 없음
+                    del self._actors[actor.room]
+                    self.stopped += 1
+                    return
+                continue
+            batch = [first]
+            while len(batch) < self.max_batch and not actor.inbox.empty():
+                batch.append(actor.inbox.get_nowait())
+            self.batches += 1
+            await self._process(actor.room, batch)
+
+    async def _process(self, room: str, batch: List[Tuple[Any, asyncio.Future]]):
+        payloads: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        for item, fut in batch:
+            if isinstance(item, dict):
+                payloads.append((item, fut))
+                continue
+            await self._publish(room, payloads)
+            payloads = []
+            try:
+                result = await item()
+            except Exception as e:
+                logger.exception("room actor %s: job failed", room)
+                _resolve(fut, error=e)
+            else:
+                _resolve(fut, result)
+            self.processed += 1
+        await self._publish(room, payloads)
+
+    async def _publish(self, room: str, payloads: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        if not payloads:
+            return
+        try:
+            await self.publish_batch(room, [p for p, _ in payloads])
+        except Exception as e:
+            logger.exception("room actor %s: failed to publish %d message(s)", room, len(payloads))
+            for _, fut in payloads:
+                _resolve(fut, error=e)
+        else:
+            for _, fut in payloads:
+                _resolve(fut)
+        self.processed += len(payloads)
+
+
+def _resolve(fut: asyncio.Future, result: Any = None, error: Exception | None = None):
+    if fut.done():  # 기다리던 쪽이 취소된 경우
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
@@ -0,0 +1,70 @@
+"""In-process room metadata cache
+
+방 비밀번호, 고정 메시지 ID, 삭제 보호 여부는 거의 바뀌지 않으므로
+시작 시 rooms 테이블 전체를 읽어 두고, 바뀌는 경로(add_room,
+delete_room_db, set_pinned_message)에서만 정확히 갱신합니다.
+입장 인증과 업로드 시 방 존재 확인은 DB를 거치지 않습니다.
+"""
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+
+class RoomMeta:
+    __slots__ = ("password", "pinned_message_id", "protected")
+
+    def __init__(self, password: str, pinned_message_id: int | None, protected: bool):
+        self.password = password
+        self.pinned_message_id = pinned_message_id
+        self.protected = protected
+
+
+class RoomMetaCache:
+    def __init__(self):
+        self.loaded = False
+        self._rooms: Dict[str, RoomMeta] = {}
+        self._protected: frozenset = frozenset()
+        self._lock = threading.Lock()  # DB 스레드 풀에서도 갱신됨
+
+    def set_protected(self, names: Iterable[str]):
+        """삭제할 수 없는 방 목록을 지정합니다."""
+        with self._lock:
+            self._protected = frozenset(names)
+            for name, meta in self._rooms.items():
+                meta.protected = name in self._protected
+
+    def load(self, rows: Iterable[Tuple[str, str, int | None]]):
+        """(name, password, pinned_message_id) 전체 목록으로 캐시를 채웁니다."""
+        with self._lock:
+            self._rooms = {name: RoomMeta(password, pinned, name in self._protected)
+                           for name, password, pinned in rows}
+            self.loaded = True
+
+    def get(self, name: str) -> RoomMeta | None:
+        return self._rooms.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._rooms)
+
+    def is_protected(self, name: str) -> bool:
+        return name in self._protected
+
+    def put(self, name: str, password: str, pinned_message_id: int | None = None):
+        with self._lock:
+            self._rooms[name] = RoomMeta(password, pinned_message_id, name in self._protected)
+
+    def set_pinned(self, name: str, msg_id: int | None):
+        meta = self._rooms.get(name)
+        if meta is not None:
+            meta.pinned_message_id = msg_id
+
+    def remove(self, name: str):
+        with self._lock:
+            self._rooms.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._rooms = {}
+            self.loaded = False
+
+
+room_cache = RoomMetaCache()
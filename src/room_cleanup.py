@@ -0,0 +1,118 @@
+"""Background cleanup of deleted rooms
+
+방을 삭제하면 rooms 행만 바로 지우고 room_deletions에 정리 작업을 등록합니다. 이 작업이
+백그라운드에서 순서대로 처리합니다.
+
+  1. chat_logs·리액션을 batch개씩 삭제 (트랜잭션마다 잠깐만 쓰기 잠금, 사이에 pause)
+  2. 보관 세그먼트(archive) 삭제
+  3. 업로드 참조 해제 → 다른 방에서 쓰지 않는 blob·썸네일 삭제, 예전 uploads/<room>/ 삭제
+  4. 남은 메시지·참조가 없는지 확인하고 같은 트랜잭션에서 done으로 표시 (남았으면 1부터 다시)
+
+저널과 업로드는 쓰기 트랜잭션 안에서 정리 중인 방인지 확인해 거부하므로, 삭제 뒤에 끼어든 쓰기가
+새 방에 섞이지 않습니다.
+
+진행 상황(logs_deleted / logs_total, status)은 room_deletions에 남으므로 서버가 재시작되어도
+이어서 처리하고, 여러 워커 중 하나만 작업을 맡습니다(lease). 정리가 끝나기 전에는 같은
+이름의 방을 다시 만들 수 없습니다.
+"""
+import asyncio
+import logging
+from typing import Any, Dict
+
+from . import archive, async_db
+from .uploads import BlobStore
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+class RoomCleanup:
+    def __init__(self, store: BlobStore, batch: int = 500, pause: float = 0.01,
+                 poll_interval: float = 30.0, lease: float = 60.0):
+        self.store = store
+        self.batch = max(1, batch)
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.rooms_done = 0
+        self.logs_deleted = 0
+        self.failures = 0
+        self.current: str | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())  # 재시작 전에 남은 작업부터 처리
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def pending(self, room: str) -> bool:
+        """정리가 끝나지 않은 방인지. (같은 이름으로 다시 만들기 전에 확인)"""
+        job = await async_db.get_room_deletion(room)
+        return job is not None and job["status"] in ACTIVE_STATUSES
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rooms_done": self.rooms_done,
+            "logs_deleted": self.logs_deleted,
+            "failures": self.failures,
+            "current": self.current,
+        }
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                for room in await async_db.get_pending_room_deletions():
+                    await self._process(room)
+            except Exception:
+                logger.exception("room cleanup: failed to list pending deletions")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, room: str):
+        if not await async_db.claim_room_deletion(room, self.lease):
+            return  # 다른 워커가 처리 중
+        self.current = room
+        try:
+            released = 0
+            while True:
+                await self._delete_logs(room)
+                await async_db.delete_room_archive(room)
+                await asyncio.get_running_loop().run_in_executor(None, archive.remove_room, room)
+                released += await self.store.drop_room(room)
+                if await async_db.finish_room_deletion(room, released):
+                    break
+                logger.warning("room cleanup: %s got writes while deleting, sweeping again", room)
+            self.rooms_done += 1
+            logger.info("room cleanup: %s done (%d blob(s) removed)", room, released)
+        except Exception as e:
+            # pending으로 되돌려 다음 주기에 이어서 처리
+            self.failures += 1
+            logger.exception("room cleanup: %s failed", room)
+            await async_db.update_room_deletion(room, "pending", error=str(e))
+        finally:
+            self.current = None
+
+    async def _delete_logs(self, room: str):
+        while True:
+            deleted = await async_db.delete_room_logs_batch(room, self.batch)
+            self.logs_deleted += deleted
+            if deleted < self.batch:
+                return
+            await asyncio.sleep(self.pause)  # 배치 사이에 실시간 쓰기가 먼저 처리되도록
@@ -1,49 +1,82 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Depends
-from fastapi.responses import HTMLResponse, Response
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, Response, FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi import Body
 from typing import Dict, Any
-import json, os
-from fastapi import UploadFile, File, Form
+import asyncio, json, os, html, mimetypes, time
+from functools import partial
 from uuid import uuid4
+from urllib.parse import unquote
 from fastapi import Header
 from datetime import datetime, timezone
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response as StarletteResponse
+try:
+    # Starlette 1.x: 이미 끊긴 소켓에서 receive/send하면 WebSocketDisconnect가 아닌 이 예외(RuntimeError)
+    from starlette.websockets import WebSocketDisconnected
+except ImportError:
+    WebSocketDisconnected = WebSocketDisconnect
 
-# Database integration
-from .database import (
-    init_db, log_message, get_past_logs,
+# Database integration (DB 스레드 풀에서 실행되는 awaitable 버전)
+from .async_db import (
+    init_db, load_room_cache, get_past_logs, get_logs_before, get_logs_after, search_messages,
+    get_retention_policies, set_retention_policy, get_archive_stats, get_archived_through, get_room_deletion,
     add_room, get_room_password, get_all_rooms, delete_room_db, room_exists,
-    add_reaction, remove_reaction, get_message_by_id,
-    set_pinned_message, get_pinned_message_id
+    add_reaction, remove_reaction, get_message_by_id, set_message_thumb,
+    set_pinned_message, get_pinned_message_id, close as close_db
 )
+from .journal import MessageJournal
+from .fanout import Outbox, stats as fanout_stats
+from .connections import ConnectionRegistry, Session
+from .backplane import create_backplane
+from .room_actor import RoomActors
+from .ordering import DeliveryOrder
+from .assets import AssetManifest, negotiate
+from .uploads import UploadPipeline, UploadError, BlobStore, ChunkedUploads, StoredUpload
+from .thumbnails import ThumbnailService
+from .retention import RetentionJob
+from .room_cleanup import RoomCleanup
+from . import frames, metrics
+from .hotcache import RecentMessages
+from .room_cache import room_cache
+from .typing_tracker import TypingTracker
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 PROTECTED_ROOMS = {"구글"} # These rooms cannot be deleted
+room_cache.set_protected(PROTECTED_ROOMS)
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "del")
-APP_VERSION = "2.0.2"  # Increment this when you update static files
+MAX_PAGE_SIZE = 200  # /api/rooms/{room}/messages 한 페이지 최대 메시지 수
+MAX_SEARCH_PAGE = 50  # /api/rooms/{room}/search 한 페이지 최대 결과 수
+HISTORY_SIZE = 50    # 입장 시 history 프레임에 담는 메시지 수
 
-app = FastAPI()
+# Pub/sub between worker processes: BACKPLANE=local (single process) | sqlite (uvicorn --workers N)
+BACKPLANE = os.environ.get("BACKPLANE", "local")
 
-# Custom StaticFiles with cache control
-class CachedStaticFiles(StaticFiles):
-    async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
-            async def send_wrapper(message):
-                if message["type"] == "http.response.start":
-                    headers = dict(message.get("headers", []))
-                    # Add cache control header for static files
-                    headers[b"cache-control"] = b"public, max-age=3600"
-                    message["headers"] = [(k, v) for k, v in headers.items()]
-                await send(message)
-            await super().__call__(scope, receive, send_wrapper)
-        else:
-            await super().__call__(scope, receive, send)
+# Write-behind journal: group commit every N messages or T ms
+# JOURNAL_DURABILITY=commit (ack after commit) | enqueue (ack after enqueue)
+# 여러 워커가 쓰면 ID를 커밋 시점에 매겨 워커 간에도 보낸 순서를 유지
+journal = MessageJournal(
+    batch_size=int(os.environ.get("JOURNAL_BATCH_SIZE", "64")),
+    flush_ms=int(os.environ.get("JOURNAL_FLUSH_MS", "20")),
+    durability=os.environ.get("JOURNAL_DURABILITY", "commit"),
+    ids_at_commit=BACKPLANE != "local",
+)
+
+# Per-connection send queues: OUTBOX_ON_FULL=evict (disconnect slow consumer) | drop
+OUTBOX_MAX = int(os.environ.get("OUTBOX_MAX", "256"))
+OUTBOX_ON_FULL = os.environ.get("OUTBOX_ON_FULL", "evict")
+OUTBOX_DROPPABLE = tuple(t.strip() for t in os.environ.get("OUTBOX_DROPPABLE", "typing").split(",") if t.strip())
+
+backplane = create_backplane(
+    BACKPLANE,
+    os.environ.get("BACKPLANE_PATH", os.path.join("data", "backplane.db")),
+    poll_ms=int(os.environ.get("BACKPLANE_POLL_MS", "50")),
+)
+
+app = FastAPI()
 
 # Add cache control middleware for HTML
 class HTMLCacheControlMiddleware(BaseHTTPMiddleware):
@@ -62,29 +95,155 @@ app.add_middleware(HTMLCacheControlMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    await asyncio.get_running_loop().run_in_executor(None, static_assets.build)
+    await init_db()
+    await journal.start()
+    await backplane.start(deliver)
+    room_actors.start(publish_batch)
+    if UPLOAD_DEDUP_SCAN:
+        asyncio.create_task(blob_store.scan(remove_originals=UPLOAD_DEDUP_SCAN_REMOVE))
+    chunked_uploads.start()
+    retention.start()
+    room_cleanup.start()
+    typing_tracker.start(send_typing_update)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await typing_tracker.stop_task()
+    await chunked_uploads.stop()
+    await retention.stop()
+    await room_cleanup.stop()
+    await room_actors.stop()
+    await backplane.stop()
+    await journal.stop()
+    thumbnails.shutdown()
+    await close_db()
 
 templates = Jinja2Templates(directory="templates")
-app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
-# In-memory store for active websocket connections
-rooms: Dict[str, Dict[WebSocket, str]] = {}
+# Static files: 시작 시 내용 해시 이름과 gzip/brotli 버전을 만들고, 템플릿은 asset_url()로 참조
+static_assets = AssetManifest("static")
+templates.env.globals["asset_url"] = static_assets.url
+
+# In-memory store for active websocket connections (room -> sessions, ws -> session)
+connections = ConnectionRegistry()
+presence_versions: Dict[str, int] = {}  # room -> 이 워커가 전달한 참가자 변화마다 1씩 증가
+remote_typing: Dict[str, Dict[str, list]] = {}  # room -> 다른 워커 -> 입력 중인 사용자
+
+# Streaming uploads: size / quota in MB, rates in MB/s (0 = unlimited)
+# Uploads are stored once per content hash; UPLOAD_DEDUP_SCAN=1 migrates old uploads/<room>/ files at startup
+# (originals are kept unless UPLOAD_DEDUP_SCAN_REMOVE=1)
+blob_store = BlobStore("uploads")
+UPLOAD_DEDUP_SCAN = os.environ.get("UPLOAD_DEDUP_SCAN", "1") == "1"
+UPLOAD_DEDUP_SCAN_REMOVE = os.environ.get("UPLOAD_DEDUP_SCAN_REMOVE", "0") == "1"
+upload_pipeline = UploadPipeline(
+    blob_store,
+    max_bytes=int(float(os.environ.get("UPLOAD_MAX_MB", "50")) * 1024 * 1024),
+    room_quota=int(float(os.environ.get("UPLOAD_ROOM_QUOTA_MB", "0")) * 1024 * 1024),
+    rate=int(float(os.environ.get("UPLOAD_RATE_MBPS", "0")) * 1024 * 1024),
+    room_rate=int(float(os.environ.get("UPLOAD_ROOM_RATE_MBPS", "0")) * 1024 * 1024),
+    client_rate=int(float(os.environ.get("UPLOAD_CLIENT_RATE_MBPS", "0")) * 1024 * 1024),
+    max_wait=float(os.environ.get("UPLOAD_RATE_MAX_WAIT_S", "2")),
+)
+# Resumable chunked uploads: chunk size in MB, sessions idle longer than UPLOAD_SESSION_TTL_H expire
+chunked_uploads = ChunkedUploads(
+    upload_pipeline,
+    chunk_size=int(float(os.environ.get("UPLOAD_CHUNK_MB", "4")) * 1024 * 1024),
+    ttl=float(os.environ.get("UPLOAD_SESSION_TTL_H", "24")) * 3600,
+)
+# Image thumbnails (WebP, needs Pillow): longest side in px, converter threads, max queued conversions
+thumbnails = ThumbnailService(
+    blob_store,
+    size=int(os.environ.get("THUMB_SIZE", "480")),
+    workers=int(os.environ.get("THUMB_WORKERS", "2")),
+    max_pending=int(os.environ.get("THUMB_MAX_PENDING", "32")),
+)
+# Retention: 기본 보존 정책(0 = 제한 없음, 방별로 /api/rooms/{room}/retention에서 변경)
+# 넘긴 메시지는 data/archive/의 압축 세그먼트로 옮기고 과거 기록 조회에서 계속 읽힘
+retention = RetentionJob(
+    interval=float(os.environ.get("RETENTION_INTERVAL_S", "3600")),
+    batch=int(os.environ.get("RETENTION_BATCH", "1000")),
+    default_max_age_days=float(os.environ.get("RETENTION_MAX_AGE_DAYS", "0")),
+    default_max_rows=int(os.environ.get("RETENTION_MAX_ROWS", "0")),
+)
+# Deleted rooms: 기록·파일은 백그라운드에서 ROOM_CLEANUP_BATCH개씩 정리
+room_cleanup = RoomCleanup(
+    blob_store,
+    batch=int(os.environ.get("ROOM_CLEANUP_BATCH", "500")),
+    pause=int(os.environ.get("ROOM_CLEANUP_PAUSE_MS", "10")) / 1000,
+)
+# 업로드 주소와 해시 이름의 정적 파일은 내용이 바뀌지 않으므로 오래 캐시
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Per-room actors: 방마다 inbox 하나로 저장·전송 순서를 보장
+room_actors = RoomActors(
+    idle_timeout=int(os.environ.get("ROOM_ACTOR_IDLE_S", "30")),
+    max_batch=int(os.environ.get("ROOM_ACTOR_BATCH", "64")),
+    inbox_max=int(os.environ.get("ROOM_INBOX_MAX", "1024")),
+)
+
+PONG_FRAME = frames.encode({"type": "pong"})
+
+# 여러 워커: 앞 메시지(prev_id)가 다른 워커에서 아직 오지 않았으면 최대 DELIVERY_ORDER_WAIT_MS 기다림
+delivery_order = DeliveryOrder(
+    lambda room, payload, origin: deliver_now(room, payload, origin),
+    max_wait=int(os.environ.get("DELIVERY_ORDER_WAIT_MS", "1000")) / 1000,
+)
+
+# Per-room ring buffer of recent message payloads (joins, resyncs, pins)
+recent = RecentMessages(
+    per_room=int(os.environ.get("RECENT_PER_ROOM", "200")),
+    max_bytes=int(os.environ.get("RECENT_MAX_MB", "32")) * 1024 * 1024,
+)
+
+# Typing indicators: per-user state with expiry, coalesced per-room updates
+typing_tracker = TypingTracker(
+    timeout=int(os.environ.get("TYPING_TIMEOUT_MS", "4000")) / 1000,
+    min_interval=int(os.environ.get("TYPING_MIN_INTERVAL_MS", "1000")) / 1000,
+    interval=int(os.environ.get("TYPING_FLUSH_MS", "500")) / 1000,
+)
+
+# Prometheus /metrics: 워커별 값. METRICS_TOKEN이 있으면 Bearer 토큰 필요
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+messages_total = metrics.registry.counter(
+    "webchat_messages_total", "Messages accepted by this worker's room actors.", ("type",))
+broadcast_seconds = metrics.registry.histogram(
+    "webchat_broadcast_seconds", "Time from broadcast() to the message being logged and published.",
+    ("type",))
+fanout_seconds = metrics.registry.histogram(
+    "webchat_fanout_seconds", "Time to encode a delivered message and queue it on this worker's connections.")
+metrics.registry.gauge_fn("webchat_connections", "Open WebSocket connections on this worker.",
+                          lambda: len(connections))
+metrics.registry.gauge_fn("webchat_active_rooms", "Rooms with at least one connection on this worker.",
+                          lambda: len(connections.counts()))
+metrics.registry.gauge_fn("webchat_rooms", "Known rooms.", lambda: len(room_cache.names()))
+metrics.registry.gauge_fn("webchat_outbox_depth", "Frames waiting in this worker's connection outboxes.",
+                          lambda: sum(s.outbox.depth for s in connections.sessions() if s.outbox))
+metrics.registry.counter_fn("webchat_fanout_frames_total", "Outbox events by outcome (enqueued, sent, dropped, evicted, send_failures).",
+                            lambda: {(k,): v for k, v in fanout_stats.as_dict().items()}, ("outcome",))
+metrics.registry.gauge_fn("webchat_journal_depth", "Messages waiting for the next group commit.",
+                          lambda: journal.depth)
+metrics.registry.gauge_fn("webchat_room_actors", "Running room actors.",
+                          lambda: room_actors.stats()["active"])
+metrics.registry.gauge_fn("webchat_uploads_active", "Uploads currently being received.",
+                          lambda: upload_pipeline.active)
+metrics.registry.counter_fn("webchat_uploads_rejected_total", "Uploads rejected by size, quota or rate limits.",
+                            lambda: upload_pipeline.rejected)
 
 
 async def room_auth(room: str, password: str):
-    expected = get_room_password(room)
+    expected = await get_room_password(room)
     if expected is None:
         raise HTTPException(status_code=404, detail="room not found")
     if expected != password:
         raise HTTPException(status_code=403, detail="wrong password")
 
 os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 
 @app.get("/api/rooms")
-def list_rooms():
-    return {"rooms": sorted(get_all_rooms())}
+async def list_rooms():
+    return {"rooms": sorted(await get_all_rooms())}
 
 @app.post("/api/rooms")
 async def create_room(request: Request):
@@ -100,32 +259,205 @@ async def create_room(request: Request):
 
     if not name or not password:
         raise HTTPException(status_code=400, detail="name and password are required")
-    if room_exists(name):
+    if await room_exists(name):
         raise HTTPException(status_code=409, detail="room already exists")
+    if await room_cleanup.pending(name):
+        raise HTTPException(status_code=409, detail="room is being deleted")
 
-    add_room(name, password)
+    await add_room(name, password)
+    await backplane.publish(name, {"type": "_room_added"})
     return {"ok": True, "room": name}
 
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "version": APP_VERSION
-    })
+    return templates.TemplateResponse(request, "index.html")
 
 @app.get("/room", response_class=HTMLResponse)
 def room_page(request: Request, room: str):
     # 방 존재 체크를 프론트에서 막지 말고, WS에서 비번 검증으로 처리
-    return templates.TemplateResponse("room.html", {
-        "request": request,
-        "room": room,
-        "version": APP_VERSION
-    })
+    return templates.TemplateResponse(request, "room.html", {"room": room})
+
+def log_to_payload(log: Dict[str, Any]) -> Dict[str, Any]:
+    """chat_logs 행을 클라이언트로 보낼 페이로드로 변환합니다."""
+    if log['type'] == 'system':
+        payload = {"type": "system", "message": log["message"]}
+    else:
+        payload = {
+            "type": log["type"],
+            "from": log["username"],
+            "message": log["message"],
+            "url": log["url"],
+            "filename": log["filename"],
+            "color": log["color"],
+        }
+
+    # Add new fields
+    if log.get("id"):
+        payload["id"] = log["id"]
+    if log.get("reply_to_id"):
+        payload["reply_to_id"] = log["reply_to_id"]
+    if log.get("thumb_url"):
+        payload["thumb_url"] = log["thumb_url"]
+    if log.get("reactions"):
+        payload["reactions"] = json.loads(log["reactions"]) if isinstance(log["reactions"], str) else log["reactions"]
+
+    ts = log.get("timestamp")
+    if ts:
+        payload["timestamp"] = ts if "T" in ts else f"{ts.replace(' ', 'T')}Z"
+    return payload
+
+
+@app.get("/api/rooms/{room}/messages")
+async def room_messages(room: str, before_id: int | None = None, limit: int = 50,
+                        x_room_password: str = Header(None)):
+    """before_id 이전의 메시지를 최신 쪽부터 한 페이지씩 돌려줍니다. (비밀번호는 URL 인코딩)"""
+    await room_auth(room, unquote(x_room_password or ""))
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    await journal.flush()
+    logs = await get_logs_before(room, before_id, limit + 1)
+    has_more = len(logs) > limit
+    logs = logs[-limit:]
+    return {
+        "messages": [log_to_payload(log) for log in logs],
+        "has_more": has_more,
+        "next_before_id": logs[0]["id"] if logs else None,
+    }
+
+def snippet_html(snippet: str | None) -> str:
+    """FTS snippet(\\x02 ... \\x03 표시)을 이스케이프하고 일치 부분을 <mark>로 감쌉니다."""
+    return html.escape(snippet or "").replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+@app.get("/api/rooms/{room}/search")
+async def room_search(room: str, q: str = "", before_id: int | None = None, limit: int = 20,
+                      sort: str = "recent", x_room_password: str = Header(None)):
+    """방 전체 기록에서 메시지를 검색합니다. sort=recent(before_id로 페이지 이동) | relevance
+
+    보존 정책으로 archive 세그먼트에 옮긴 메시지는 검색 색인에서 빠지므로, 그런 메시지가 있으면
+    partial=true와 함께 archived_through_id(이 ID 이하는 검색되지 않음)를 돌려줍니다.
+    """
+    await room_auth(room, unquote(x_room_password or ""))
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q is required")
+    if sort not in ("recent", "relevance"):
+        raise HTTPException(status_code=400, detail="sort must be recent or relevance")
+    limit = max(1, min(limit, MAX_SEARCH_PAGE))
+
+    await journal.flush()
+    rows = await search_messages(room, q, before_id, limit + 1, sort)
+    if rows is None:
+        raise HTTPException(status_code=503, detail="search is not available")
+    archived_through = await get_archived_through(room)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = []
+    for row in rows:
+        result = log_to_payload(row)
+        result["snippet"] = snippet_html(row["snippet"])
+        result["score"] = round(-row["rank"], 4)  # bm25는 작을수록 관련도가 높음
+        results.append(result)
+    return {
+        "results": results,
+        "has_more": has_more,
+        # relevance 순은 새 메시지가 들어오면 순위가 바뀌므로 다음 페이지 커서는 recent 순에만 제공
+        "next_before_id": rows[-1]["id"] if rows and has_more and sort == "recent" else None,
+        "partial": archived_through is not None,
+        "archived_through_id": archived_through,
+    }
+
+def pin_payload(pinned: Dict[str, Any]) -> Dict[str, Any]:
+    """chat_logs 행 또는 캐시된 메시지 페이로드로 pin_update 메시지를 만듭니다."""
+    return {
+        "type": "pin_update",
+        "msg_id": pinned.get("id"),
+        "from": pinned.get("username") or pinned.get("from"),
+        "message": pinned.get("message"),
+        "color": pinned.get("color") or "#1a73e8",
+        "timestamp": pinned.get("timestamp")
+    }
 
-async def broadcast_participants(room: str):
-    if room in rooms:
-        participants = list(rooms[room].values())
-        await broadcast(room, {"type": "participants", "users": sorted(participants)})
+
+async def recent_messages(room: str, limit: int) -> tuple:
+    """최근 limit개 메시지 페이로드와 has_more. 링 버퍼에 없으면 DB에서 읽어 버퍼를 채웁니다."""
+    hit = recent.latest(room, limit)
+    if hit is not None:
+        return hit
+
+    await journal.flush()
+    logs = await get_past_logs(room, recent.per_room + 1)
+    complete = len(logs) <= recent.per_room
+    messages = [log_to_payload(log) for log in logs[-recent.per_room:]]
+    recent.load(room, messages, [len(frames.encode(m)) for m in messages], complete)
+    return messages[-limit:], len(messages) > limit or not complete
+
+
+async def find_message(room: str, msg_id: int) -> Dict[str, Any] | None:
+    """메시지 페이로드 또는 chat_logs 행. 링 버퍼를 먼저 확인합니다."""
+    cached = recent.get(room, msg_id)
+    if cached is not None:
+        return cached
+    await journal.flush()
+    return await get_message_by_id(msg_id)
+
+
+async def current_pin(room: str) -> Dict[str, Any] | None:
+    known, pinned = recent.pinned(room)
+    if known:
+        return pinned
+
+    pinned = None
+    try:
+        pinned_id = await get_pinned_message_id(room)
+        if pinned_id:
+            row = await find_message(room, pinned_id)
+            if row:
+                pinned = pin_payload(row)
+    except Exception:
+        return None
+    recent.set_pinned(room, pinned)
+    return pinned
+
+
+async def history_payload(room: str, last_id: int | None = None, limit: int = HISTORY_SIZE) -> Dict[str, Any]:
+    """
+    입장 시 보내는 history 메시지: 최근 메시지 + 현재 고정 메시지.
+    mode:
+      - "full"  : 최근 limit개 (처음 입장)
+      - "delta" : 재연결한 클라이언트가 마지막으로 본 last_id 이후의 메시지만
+      - "reset" : 놓친 메시지가 limit개를 넘음 → 클라이언트는 화면을 비우고 최근 limit개로 다시 그림
+    """
+    mode, has_more = "full", None
+    if last_id is not None:
+        messages = recent.since(room, last_id)
+        if messages is None:
+            await journal.flush()
+            messages = [log_to_payload(log) for log in await get_logs_after(room, last_id, limit + 1)]
+        mode = "delta" if len(messages) <= limit else "reset"
+
+    if mode != "delta":
+        messages, has_more = await recent_messages(room, limit)
+
+    payload = {
+        "type": "history",
+        "mode": mode,
+        "messages": messages,
+        "pinned": await current_pin(room),
+    }
+    if has_more is not None:
+        payload["has_more"] = has_more
+    return payload
+
+def participants_snapshot(room: str) -> str:
+    """새로 들어온 사용자에게만 보내는 전체 참가자 목록 프레임. (다른 워커 접속자 포함)"""
+    users = sorted(connections.usernames(room) + backplane.remote_members(room))
+    return frames.encode({"type": "participants", "users": users, "version": presence_versions.get(room, 0)})
+
+
+async def broadcast_presence(room: str, op: str, user: str, **fields):
+    """참가자 변화(join/leave/rename)만 알립니다. 버전은 각 워커가 전달할 때 붙이며(deliver),
+    클라이언트는 버전이 건너뛰면 스냅샷을 요청합니다."""
+    await broadcast(room, {"type": "presence", "op": op, "user": user, **fields})
 
 
 @app.websocket("/ws")
@@ -137,9 +469,11 @@ async def websocket_endpoint(ws: WebSocket):
             await ws.close(code=4000); return
 
         room = join_msg.get("room") or ""
-        username = join_msg.get("username") or "anon"
         password = join_msg.get("password") or ""
-        color = join_msg.get("color") or "#1a73e8"
+        try:
+            last_id = int(join_msg["last_id"]) if join_msg.get("last_id") is not None else None
+        except (TypeError, ValueError):
+            last_id = None
 
         try:
             await room_auth(room, password)
@@ -147,84 +481,44 @@ async def websocket_endpoint(ws: WebSocket):
             await ws.send_json({"type": "error", "message": e.detail})
             await ws.close(code=4001); return
 
-        # Send past logs to the newly joined user
-        past_logs = get_past_logs(room)
-        for log in past_logs:
-            if log['type'] == 'system':
-                payload = {"type": "system", "message": log["message"]}
-            else:
-                payload = {
-                    "type": log["type"],
-                    "from": log["username"],
-                    "message": log["message"],
-                    "url": log["url"],
-                    "filename": log["filename"],
-                    "color": log["color"],
-                }
-
-            # Add new fields
-            if log.get("id"):
-                payload["id"] = log["id"]
-            if log.get("reply_to_id"):
-                payload["reply_to_id"] = log["reply_to_id"]
-            if log.get("reactions"):
-                import json
-                payload["reactions"] = json.loads(log["reactions"]) if isinstance(log["reactions"], str) else log["reactions"]
-
-            ts = log.get("timestamp")
-            if ts:
-                payload["timestamp"] = ts if "T" in ts else f"{ts.replace(' ', 'T')}Z"
-            await ws.send_json(payload)
-
-        # Send current pinned message (if any)
-        try:
-            pinned_id = get_pinned_message_id(room)
-            if pinned_id:
-                pinned = get_message_by_id(pinned_id)
-                if pinned:
-                    await ws.send_json({
-                        "type": "pin_update",
-                        "msg_id": pinned.get("id"),
-                        "from": pinned.get("username"),
-                        "message": pinned.get("message"),
-                        "color": pinned.get("color") or "#1a73e8",
-                        "timestamp": pinned.get("timestamp")
-                    })
-        except Exception:
-            pass
+        # Send past logs + current pinned message as a single pre-encoded frame
+        await ws.send_text(frames.encode(await history_payload(room, last_id)))
 
-        rooms.setdefault(room, {})[ws] = username
-        await broadcast(room, {"type": "system", "message": f"{username}님이 입장했습니다."})
-        await broadcast_participants(room)
+        session = Session(ws, room, join_msg.get("username") or "anon", join_msg.get("color") or "#1a73e8",
+                          Outbox(ws, OUTBOX_MAX, OUTBOX_ON_FULL, OUTBOX_DROPPABLE, on_close=leave_room))
+        session.outbox.start()
+        connections.add(session)
+        await broadcast(room, {"type": "system", "message": f"{session.username}님이 입장했습니다."})
+        await broadcast_presence(room, "join", session.username)
+        session.offer(participants_snapshot(room), "participants")
 
-        while True:
+        # outbox writer가 전송 실패·퇴출로 연결을 닫았으면 더 받지 않음 (정리는 finally에서)
+        while not session.outbox.closed:
             payload = await ws.receive_json()
             msg_type = payload.get("type")
+            session.seen()
 
             if msg_type == "chat":
                 msg = str(payload.get("message") or "")
-                color = payload.get("color") or color
+                session.color = payload.get("color") or session.color
                 reply_to_id = payload.get("reply_to_id")
+                typing_tracker.stop(room, session.username)
                 await broadcast(room, {
                     "type": "chat",
-                    "from": username,
+                    "from": session.username,
                     "message": msg,
-                    "color": color,
+                    "color": session.color,
                     "reply_to_id": reply_to_id
                 })
 
             elif msg_type == "rename":
                 new_name = (payload.get("new") or "").strip()
-                if new_name and new_name != username:
-                    old = username
-                    username = new_name
-                    rooms[room][ws] = new_name
-                    await broadcast(room, {"type": "system", "message": f"{old} → {username} 닉네임 변경"})
-                    await broadcast_participants(room)
+                if new_name and new_name != session.username:
+                    await room_actors.submit(room, partial(apply_rename, room, session, new_name))
 
             elif msg_type == "typing":
-                # Broadcast typing indicator without logging
-                await broadcast(room, {"type": "typing", "from": username})
+                # 바로 브로드캐스트하지 않고 상태만 갱신 (send_typing_update가 모아서 전송)
+                typing_tracker.touch(room, session.username)
 
             elif msg_type == "reaction":
                 msg_id = payload.get("msg_id")
@@ -232,17 +526,8 @@ async def websocket_endpoint(ws: WebSocket):
                 action = payload.get("action")  # "add" or "remove"
 
                 if msg_id and emoji:
-                    if action == "add":
-                        reactions = add_reaction(msg_id, emoji, username)
-                    else:
-                        reactions = remove_reaction(msg_id, emoji, username)
-
-                    # Broadcast updated reactions
-                    await broadcast(room, {
-                        "type": "reaction_update",
-                        "msg_id": msg_id,
-                        "reactions": reactions
-                    })
+                    await room_actors.submit(room, partial(
+                        apply_reaction, room, session, msg_id, emoji, action == "add"))
 
             elif msg_type == "pin":
                 action = (payload.get("action") or "").lower()
@@ -250,61 +535,191 @@ async def websocket_endpoint(ws: WebSocket):
                     msg_id = payload.get("msg_id")
                     if msg_id:
                         try:
-                            set_pinned_message(room, int(msg_id))
-                            pinned = get_message_by_id(int(msg_id))
-                            if pinned:
-                                await broadcast(room, {
-                                    "type": "pin_update",
-                                    "msg_id": pinned.get("id"),
-                                    "from": pinned.get("username"),
-                                    "message": pinned.get("message"),
-                                    "color": pinned.get("color") or "#1a73e8",
-                                    "timestamp": pinned.get("timestamp")
-                                })
+                            await room_actors.submit(room, partial(apply_pin, room, int(msg_id)))
                         except Exception:
                             pass
                 elif action == "clear":
                     try:
-                        set_pinned_message(room, None)
-                        await broadcast(room, {"type": "pin_update", "msg_id": None})
+                        await room_actors.submit(room, partial(apply_pin, room, None))
                     except Exception:
                         pass
 
+            elif msg_type == "participants":
+                # 클라이언트가 presence 버전 누락을 감지하면 스냅샷을 다시 요청
+                session.offer(participants_snapshot(room), "participants")
+
             elif msg_type == "ping":
-                await ws.send_json({"type": "pong"})
-    except WebSocketDisconnect:
+                session.offer(PONG_FRAME, "pong")
+    except (WebSocketDisconnect, WebSocketDisconnected):
         pass
     finally:
-        room_left, user_left = None, None
-        for r, conns in list(rooms.items()):
-            if ws in conns:
-                user_left = conns.pop(ws)
-                room_left = r
-                if not conns:
-                    rooms.pop(r, None)
-                break
+        await leave_room(ws)
+
+
+async def leave_room(ws: WebSocket):
+    """연결을 방에서 제거하고 퇴장을 알립니다. (연결 종료·전송 실패·slow consumer 퇴출 시)"""
+    session = connections.remove(ws)
+    if session is None:
+        return
+    if session.outbox:
+        session.outbox.close()
+
+    typing_tracker.stop(session.room, session.username)
+    await broadcast(session.room, {"type": "system", "message": f"{session.username}님이 나갔습니다."})
+    await broadcast_presence(session.room, "leave", session.username)
 
-        if room_left and user_left:
-            await broadcast(room_left, {"type": "system", "message": f"{user_left}님이 나갔습니다."})
-            await broadcast_participants(room_left)
+
+async def send_typing_update(room: str, users: list):
+    await broadcast(room, {"type": "typing", "users": users})
 
 
 async def broadcast(room: str, payload: dict):
+    """방 actor의 inbox를 거쳐 순서대로 저장·전송하고, 처리가 끝나면 반환합니다."""
+    started = time.perf_counter()
+    await room_actors.submit(room, payload)
+    broadcast_seconds.observe(time.perf_counter() - started, payload.get("type") or "unknown")
+
+
+async def publish_batch(room: str, payloads: list):
+    """방 actor가 모은 페이로드를 저장한 뒤 순서대로 전송합니다. (actor 작업 안에서는 이것을 직접 호출)"""
     # Log first, then broadcast
-    if "timestamp" not in payload:
-        payload["timestamp"] = datetime.now(timezone.utc).isoformat(timespec='seconds')
-    if payload.get("type") in ["chat", "file", "system"]:
-        msg_id = log_message(room, payload)
+    now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    logged = []
+    for payload in payloads:
+        payload.setdefault("timestamp", now)
+        messages_total.inc(payload.get("type") or "unknown")
+        if payload.get("type") in ["chat", "file", "system"]:
+            logged.append(payload)
+    # ID는 호출 순서대로 할당되고, 같은 group commit으로 함께 저장됨
+    msg_ids = await asyncio.gather(*(journal.append(room, payload) for payload in logged))
+    for payload, msg_id in zip(logged, msg_ids):
         if msg_id:
             payload["id"] = msg_id
 
-    conns = rooms.get(room, {}).copy()
-    for w in conns:
+    # 모든 워커로 보내고, 각 워커의 deliver()가 자기 연결에 전송
+    for payload in payloads:
+        await backplane.publish(room, payload)
+
+
+async def apply_rename(room: str, session: Session, new_name: str):
+    old = session.username
+    if new_name == old:
+        return
+    session.username = new_name
+    typing_tracker.rename(room, old, new_name)
+    await publish_batch(room, [
+        {"type": "system", "message": f"{old} → {new_name} 닉네임 변경"},
+        {"type": "presence", "op": "rename", "user": new_name, "old": old},
+    ])
+
+
+async def apply_reaction(room: str, session: Session, msg_id: int, emoji: str, add: bool):
+    await journal.flush()
+    if add:
+        reactions = await add_reaction(msg_id, emoji, session.username)
+    else:
+        reactions = await remove_reaction(msg_id, emoji, session.username)
+    if reactions is None:
+        # 보관(archive)됐거나 없는 메시지: 방에는 알리지 않고 보낸 사람에게만 안내
+        session.offer(frames.encode({"type": "system", "message": "보관되었거나 없는 메시지에는 리액션할 수 없습니다."}),
+                      "system")
+        return
+
+    # Broadcast updated reactions
+    await publish_batch(room, [{
+        "type": "reaction_update",
+        "msg_id": msg_id,
+        "reactions": reactions
+    }])
+
+
+async def apply_pin(room: str, msg_id: int | None):
+    await set_pinned_message(room, msg_id)
+    if msg_id is None:
+        await publish_batch(room, [{"type": "pin_update", "msg_id": None}])
+        return
+    pinned = await find_message(room, msg_id)
+    if pinned:
+        await publish_batch(room, [pin_payload(pinned)])
+
+
+async def deliver(room: str, payload: dict, origin: str):
+    """backplane 콜백. 워커 사이에서 순서가 바뀐 메시지는 ID 순서로 맞춘 뒤 deliver_now로 보냅니다."""
+    await delivery_order.push(room, payload, origin)
+
+
+async def deliver_now(room: str, payload: dict, origin: str):
+    """backplane에서 받은 페이로드를 이 워커의 캐시에 반영하고 이 워커의 연결에 보냅니다."""
+    msg_type = payload.get("type")
+    if msg_type and msg_type.startswith("_"):
+        await apply_control(room, msg_type)
+        return
+
+    if msg_type == "reaction_update":
+        recent.update_reactions(room, payload.get("msg_id"), payload.get("reactions"))
+    elif msg_type == "thumb_update":
+        recent.update_thumb(room, payload.get("msg_id"), payload.get("thumb_url"))
+    elif msg_type == "pin_update":
+        recent.set_pinned(room, payload if payload.get("msg_id") else None)
+        room_cache.set_pinned(room, payload.get("msg_id"))
+    elif msg_type == "typing" and origin != backplane.worker_id:
+        # 다른 워커의 입력 중 목록은 워커별로 보관하고, 이 워커 목록과 합쳐서 보냄
+        by_worker = remote_typing.setdefault(room, {})
+        by_worker[origin] = payload.get("users") or []
+        if not by_worker[origin]:
+            del by_worker[origin]
+        if not by_worker:
+            remote_typing.pop(room, None)
+        payload = {**payload, "users": sorted(set(typing_tracker.users(room)).union(*by_worker.values()))}
+    elif msg_type == "typing" and room in remote_typing:
+        payload = {**payload, "users": sorted(set(payload["users"]).union(*remote_typing[room].values()))}
+
+    if room not in connections:
+        if msg_type == "presence":
+            presence_versions.pop(room, None)
+        if not payload.get("id"):
+            return
+    elif msg_type == "presence":
+        version = presence_versions.get(room, 0) + 1
+        presence_versions[room] = version
+        payload = {**payload, "version": version}
+
+    # 한 번만 인코딩해서 각 연결의 송신 큐에 넣기만 하고, 실제 전송은 연결별 writer 태스크가 처리
+    started = time.perf_counter()
+    frame = frames.encode(payload)
+    if payload.get("id"):
+        recent.append(room, payload, len(frame))
+    for session in connections.members(room):
+        session.offer(frame, msg_type)
+    fanout_seconds.observe(time.perf_counter() - started)
+
+
+async def apply_control(room: str, msg_type: str):
+    """방 생성·삭제처럼 모든 워커의 메모리 상태를 맞춰야 하는 이벤트."""
+    if msg_type == "_room_added":
+        if room_cache.get(room) is None:
+            await load_room_cache()
+    elif msg_type == "_room_deleted":
+        room_cache.remove(room)
+        delivery_order.drop(room)
+        recent.drop(room)
+        typing_tracker.drop_room(room)
+        upload_pipeline.forget_room(room)
+        remote_typing.pop(room, None)
+        presence_versions.pop(room, None)
+        asyncio.create_task(close_room_connections(room))
+
+
+async def close_room_connections(room: str):
+    """삭제된 방의 이 워커 연결을 남은 프레임을 보낸 뒤 닫습니다."""
+    for session in connections.drop_room(room):
+        if session.outbox:
+            await session.outbox.drain()
+            session.outbox.close()
         try:
-            await w.send_json(payload)
+            await session.ws.close(code=4002)
         except Exception:
-            if room in rooms and w in rooms[room]:
-                del rooms[room][w]
+            pass
 
 
 def safe_name(filename: str) -> str:
@@ -315,38 +730,288 @@ def safe_name(filename: str) -> str:
     return f"{uuid4().hex}{ext}"
 
 @app.post("/api/upload")
-async def upload_file(room: str = Form(...), username: str = Form(...), file: UploadFile = File(...)):
-    # 방 존재 확인
-    if not room_exists(room):
-        raise HTTPException(status_code=404, detail="room not found")
+async def upload_file(request: Request):
+    """파일 업로드.
 
-    # 저장 경로 준비
-    os.makedirs(os.path.join("uploads", room), exist_ok=True)
-    fname = safe_name(file.filename)
-    fpath = os.path.join("uploads", room, fname)
+    - 본문 스트리밍: POST /api/upload?room=&username=&filename= (본문 = 파일 바이트)
+    - 기존 방식: multipart/form-data (room, username, file)
+    """
+    form = None
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            # 폼 파싱(임시 파일에 쓰기) 전에 파일 크기 상한을 적용하고, 방 할당량은 아래 receive에서 확인
+            try:
+                receive = upload_pipeline.limit_body(request.receive, request.headers.get("content-length"))
+                form = await Request(request.scope, receive).form()
+            except UploadError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            room, username, file = form.get("room"), form.get("username"), form.get("file")
+            if not room or not username or file is None or isinstance(file, str):
+                raise HTTPException(status_code=400, detail="room, username and file are required")
+            filename = file.filename or "file"
 
-    # 파일 저장
-    with open(fpath, "wb") as out:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
+            async def chunks():
+                while True:
+                    chunk = await file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+            body = chunks()
+        else:
+            room = request.query_params.get("room")
+            username = request.query_params.get("username")
+            filename = request.query_params.get("filename") or "file"
+            if not room or not username:
+                raise HTTPException(status_code=400, detail="room and username are required")
+            body = request.stream()
 
-    public_url = f"/uploads/{room}/{fname}"
+        # 방 존재 확인
+        if not await room_exists(room):
+            raise HTTPException(status_code=404, detail="room not found")
 
-    # 업로드 알림을 방에 브로드캐스트
-    await broadcast(room, {
+        # 임시 파일로 받으면서 제한 확인·해시 계산 후 uploads/<room>/<uuid>.<ext>로 이동
+        fname = safe_name(filename)
+        try:
+            stored = await upload_pipeline.receive(room, fname, body, client_key(request))
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finally:
+        if form is not None:
+            await form.close()  # 폼 파싱이 만든 임시 파일 정리
+
+    return await announce_upload(room, username, filename, fname, stored)
+
+def client_key(request: Request) -> str | None:
+    """업로드 속도 제한을 적용할 클라이언트 (접속 주소)."""
+    return request.client.host if request.client else None
+
+async def announce_upload(room: str, username: str, filename: str, fname: str, stored: StoredUpload):
+    """저장이 끝난 업로드를 방에 알리고 업로드 API 응답을 만듭니다."""
+    public_url = f"/uploads/{room}/{fname}"
+    payload = {
         "type": "file",
         "from": username,
-        "filename": file.filename,
+        "filename": filename,
         "url": public_url,
         # 파일 메시지도 보낸 사용자의 색상을 넣고 싶다면
         "color": "#1a73e8"  # 고정이 아닌 클라이언트에서 같이 보내고 싶다면 form에도 color를 추가하세요
-    })
+    }
+    # 업로드 알림을 방에 브로드캐스트
+    await broadcast(room, payload)
+
+    # 이미지 썸네일은 알림을 막지 않도록 백그라운드에서 만들고, 다 되면 thumb_update로 알림
+    if thumbnails.wants(fname) and payload.get("id"):
+        asyncio.create_task(announce_thumbnail(room, payload["id"], f"{public_url}/thumb", stored.sha256))
+
+    return {
+        "ok": True, "url": public_url, "filename": filename,
+        "size": stored.size, "sha256": stored.sha256, "deduped": stored.deduped,
+        "seconds": round(stored.seconds, 3), "throughput_mbps": round(stored.throughput, 2),
+    }
 
+async def announce_thumbnail(room: str, msg_id: int, thumb_url: str, sha256: str):
+    """썸네일을 만든 뒤 메시지에 주소를 기록하고 방에 알립니다. (만들 필요가 없거나 실패하면 원본 그대로)"""
+    if not await thumbnails.ensure(sha256):
+        return
+    await journal.flush()  # 파일 메시지가 아직 저장 전일 수 있음
+    await set_message_thumb(msg_id, thumb_url)
+    await broadcast(room, {"type": "thumb_update", "msg_id": msg_id, "thumb_url": thumb_url})
 
-    return {"ok": True, "url": public_url, "filename": file.filename}
+@app.post("/api/uploads")
+async def create_chunked_upload(request: Request):
+    """이어 올리기 세션 시작. JSON {room, username, filename, size, sha256?}
+
+    이후 PUT /api/uploads/{id}?offset= 로 청크를 (병렬로) 보내고
+    POST /api/uploads/{id}/complete 로 마무리합니다. 끊겼으면 GET /api/uploads/{id}의
+    received에 없는 offset만 다시 보냅니다.
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid JSON body")
+    room, username = data.get("room"), data.get("username")
+    filename = str(data.get("filename") or "file")
+    if not room or not username or not isinstance(data.get("size"), int):
+        raise HTTPException(status_code=400, detail="room, username and size are required")
+    if not await room_exists(room):
+        raise HTTPException(status_code=404, detail="room not found")
+    try:
+        return await chunked_uploads.create(room, username, filename, data["size"], data.get("sha256"))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.get("/api/uploads/{upload_id}")
+async def chunked_upload_status(upload_id: str):
+    try:
+        return await chunked_uploads.status(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, offset: int, request: Request,
+                           x_chunk_sha256: str = Header(None)):
+    """청크 하나 (본문 = 바이트). 길이는 chunk_size, 마지막 청크만 나머지 크기."""
+    try:
+        return await chunked_uploads.put_chunk(upload_id, offset, request.stream(), x_chunk_sha256,
+                                               client_key(request))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_chunked_upload(upload_id: str):
+    try:
+        session, fname, stored = await chunked_uploads.complete(upload_id, safe_name)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return await announce_upload(session["room"], session["username"], session["filename"], fname, stored)
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_chunked_upload(upload_id: str):
+    try:
+        await chunked_uploads.abort(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"ok": True}
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match는 약한 비교: W/ 접두사는 무시
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(path: str, request: Request):
+    """정적 파일. 해시 이름이면 immutable, 원래 이름이면 매번 ETag로 재검증합니다."""
+    asset, hashed = static_assets.lookup(path)
+    if asset is None:
+        # manifest에 없는 큰 파일 등은 디스크에서 그대로
+        root = os.path.abspath(static_assets.directory)
+        full = os.path.abspath(os.path.join(root, path))
+        if not full.startswith(root + os.sep) or not os.path.isfile(full):
+            raise HTTPException(status_code=404, detail="file not found")
+        return FileResponse(full, headers={"Cache-Control": "public, max-age=3600"})
+
+    encoding = negotiate(request.headers.get("accept-encoding"), asset.variants)
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if hashed else "no-cache",
+        "ETag": asset.etag(encoding),
+        "Vary": "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+@app.api_route("/uploads/{room}/{name}", methods=["GET", "HEAD"])
+async def serve_upload(room: str, name: str, request: Request):
+    """업로드 파일. 주소는 방별 이름이지만 실제 파일은 내용 해시로 저장된 blob입니다.
+
+    blob은 SHA-256을 강한 ETag로 쓰고 If-None-Match가 맞으면 304를 돌려줍니다.
+    Range 요청(부분 전송, 이어 받기)은 FileResponse가 처리합니다.
+    """
+    found = await blob_store.resolve(room, name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    path, sha256 = found
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if sha256 is not None:
+        headers["ETag"] = f'"{sha256}"'
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers,
+                        media_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+
+@app.api_route("/uploads/{room}/{name}/thumb", methods=["GET", "HEAD"])
+async def serve_thumbnail(room: str, name: str, request: Request):
+    """업로드 이미지의 WebP 썸네일. 디스크에 없으면(지워졌거나 예전 업로드) 다시 만듭니다."""
+    found = await blob_store.resolve(room, name)
+    if found is None or found[1] is None or not thumbnails.wants(name) \
+            or not await thumbnails.ensure(found[1]):
+        raise HTTPException(status_code=404, detail="thumbnail not found")
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{found[1]}-thumb"'}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumbnails.path_for(found[1]), headers=headers, media_type="image/webp")
+
+@app.get("/api/stats")
+async def server_stats(x_admin_token: str = Header(None)):
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+    depths = [s.outbox.depth for s in connections.sessions() if s.outbox]
+    return {
+        "fanout": {
+            **fanout_stats.as_dict(),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+        },
+        "journal": {"depth": journal.depth, "durability": journal.durability},
+        "json_backend": frames.backend_name,
+        "static": static_assets.stats(),
+        "recent": recent.stats(),
+        "typing": typing_tracker.stats(),
+        "backplane": {**backplane.stats(), "ordering": delivery_order.stats()},
+        "room_actors": room_actors.stats(),
+        "retention": {**retention.stats(), "archive": await get_archive_stats()},
+        "room_cleanup": room_cleanup.stats(),
+        "uploads": {**upload_pipeline.stats(), "chunked": chunked_uploads.stats(),
+                    "thumbnails": thumbnails.stats(), "storage": await blob_store.stats()},
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics(authorization: str = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="invalid metrics token")
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/rooms/{room}/retention")
+async def get_room_retention(room: str, x_admin_token: str = Header(None)):
+    """방의 보존 정책(설정값과 기본값을 적용한 실제 값)과 보관된 메시지 수."""
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+    policies = {name: (age, rows) for name, age, rows in await get_retention_policies()}
+    if room not in policies:
+        raise HTTPException(status_code=404, detail="room not found")
+    age, rows = policies[room]
+    return {
+        "room": room,
+        "max_age_days": age,
+        "max_rows": rows,
+        "effective": retention.policy(age, rows),
+        "archive": await get_archive_stats(room),
+    }
+
+@app.put("/api/rooms/{room}/retention")
+async def put_room_retention(room: str, request: Request, x_admin_token: str = Header(None)):
+    """JSON {max_age_days, max_rows}. null이면 서버 기본값, 0이면 제한 없음."""
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid JSON body")
+    age, rows = data.get("max_age_days"), data.get("max_rows")
+    if (age is not None and (not isinstance(age, (int, float)) or age < 0)) \
+            or (rows is not None and (not isinstance(rows, int) or rows < 0)):
+        raise HTTPException(status_code=400, detail="max_age_days and max_rows must be null or >= 0")
+    if not await set_retention_policy(room, age, rows):
+        raise HTTPException(status_code=404, detail="room not found")
+    return await get_room_retention(room, x_admin_token)
+
+@app.get("/api/connections")
+async def connection_stats(room: str | None = None, x_admin_token: str = Header(None)):
+    """방별 현재 접속 수. room을 주면 그 방의 연결별 상태도 함께 반환합니다."""
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+    result: Dict[str, Any] = {"total": len(connections), "rooms": connections.counts()}
+    if room is not None:
+        result["sessions"] = [s.as_dict() for s in connections.members(room)]
+    return result
 
 @app.delete("/api/rooms/{name}")
 async def delete_room(name: str, x_admin_token: str = Header(None)):
@@ -354,26 +1019,34 @@ async def delete_room(name: str, x_admin_token: str = Header(None)):
         raise HTTPException(status_code=401, detail="invalid admin token")
 
     name = name.strip()
-    if not room_exists(name):
+    if not await room_exists(name):
         raise HTTPException(status_code=404, detail="room not found")
-    if name in PROTECTED_ROOMS:
+    if room_cache.is_protected(name):
         raise HTTPException(status_code=403, detail="protected room")
 
-    # 1) 접속자에게 공지 후 연결 종료
-    if name in rooms:
-        try:
-            await broadcast(name, {"type": "system", "message": f"방 '{name}'이(가) 삭제되었습니다."})
-        except Exception:
-            pass
-        for ws in list(rooms[name]):
-            try:
-                await ws.close(code=4002)
-            except Exception:
-                pass
-        rooms.pop(name, None)
+    # 1) 접속자에게 공지 (모든 워커)
+    try:
+        await broadcast(name, {"type": "system", "message": f"방 '{name}'이(가) 삭제되었습니다."})
+    except Exception:
+        pass
+
+    # 2) DB에서 방 제거 후 모든 워커가 연결 종료·캐시 정리
+    await journal.flush()  # 아직 저장 전인 메시지까지 정리 대상에 포함
+    await delete_room_db(name)
+    await backplane.publish(name, {"type": "_room_deleted"})
+    await close_room_connections(name)
 
-    # 2) DB에서 방 제거
-    delete_room_db(name)
+    # 3) 기록·업로드 파일은 백그라운드에서 정리 (진행 상황: GET /api/rooms/{name}/deletion)
+    room_cleanup.schedule()
+    return {"ok": True, "deleted": name, "cleanup": await get_room_deletion(name)}
 
-    return {"ok": True, "deleted": name}
+@app.get("/api/rooms/{name}/deletion")
+async def room_deletion_status(name: str, x_admin_token: str = Header(None)):
+    """삭제한 방의 정리 진행 상황. status: pending | running | done"""
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+    job = await get_room_deletion(name)
+    if job is None:
+        raise HTTPException(status_code=404, detail="no deletion for this room")
+    return job
     
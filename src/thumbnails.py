@@ -0,0 +1,112 @@
+"""Image thumbnails
+
+업로드된 이미지의 WebP 썸네일을 blob 옆(uploads/_blobs/aa/<sha256>.thumb.webp)에 만들어
+디스크에 캐시합니다. 내용이 같으면 썸네일도 하나만 만들고, blob이 지워질 때 함께 지워집니다.
+변환은 전용 스레드 풀(workers개)에서 하고, 대기 중인 작업이 max_pending을 넘으면 건너뜁니다.
+이미 충분히 작은 이미지는 썸네일을 만들지 않습니다.
+
+Pillow가 없으면(requirements.txt에 포함) 시작할 때 경고를 남기고 썸네일 없이 원본만 사용합니다.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from uuid import uuid4
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency
+    Image = None
+
+from .uploads import BlobStore
+
+logger = logging.getLogger(__name__)
+
+THUMB_SUFFIX = ".thumb.webp"
+THUMB_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+
+class ThumbnailService:
+    def __init__(self, store: BlobStore, size: int = 480, quality: int = 80,
+                 workers: int = 2, max_pending: int = 32, max_pixels: int = 50_000_000):
+        self.store = store
+        self.size = size
+        self.quality = quality
+        self.max_pending = max_pending
+        self.max_pixels = max_pixels
+        self.generated = 0
+        self.skipped = 0   # 대기열이 가득 차서 건너뜀
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumb")
+        self._pending: Dict[str, asyncio.Future] = {}  # sha256 -> 진행 중인 변환
+        store.derived_suffixes.append(THUMB_SUFFIX)  # blob을 지울 때 썸네일도 삭제
+        if Image is None:
+            logger.warning("thumbnails: Pillow is not installed, images are shown without thumbnails")
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def wants(self, name: str) -> bool:
+        return self.available and os.path.splitext(name)[1].lower() in THUMB_EXTENSIONS
+
+    def path_for(self, sha256: str) -> str:
+        return self.store.path_for(sha256) + THUMB_SUFFIX
+
+    async def ensure(self, sha256: str) -> bool:
+        """썸네일이 있으면(없으면 만들어서) True. 만들 필요가 없거나 실패하면 False."""
+        loop = asyncio.get_running_loop()
+        path = self.path_for(sha256)
+        if await loop.run_in_executor(None, os.path.exists, path):
+            return True
+        fut = self._pending.get(sha256)
+        if fut is None:
+            if len(self._pending) >= self.max_pending:
+                self.skipped += 1
+                return False
+            fut = self._pending[sha256] = loop.run_in_executor(
+                self._executor, _make_thumbnail, self.store.path_for(sha256), path,
+                self.size, self.quality, self.max_pixels)
+            fut.add_done_callback(lambda _: self._pending.pop(sha256, None))
+        try:
+            made = await asyncio.shield(fut)
+        except Exception as e:
+            logger.warning("thumbnail: failed to convert %s: %s", sha256, e)
+            self.failed += 1
+            return False
+        if made:
+            self.generated += 1
+        return made
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "available": self.available,
+            "generated": self.generated,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "pending": len(self._pending),
+        }
+
+
+# --- 스레드에서 실행 ---
+
+def _make_thumbnail(src: str, dst: str, size: int, quality: int, max_pixels: int) -> bool:
+    with Image.open(src) as im:
+        if im.width * im.height > max_pixels:
+            raise ValueError(f"image too large: {im.width}x{im.height}")
+        if im.width <= size and im.height <= size:
+            return False  # 원본이 이미 작음
+        im.draft("RGB", (size, size))  # JPEG는 디코딩 단계에서 축소
+        thumb = ImageOps.exif_transpose(im)
+        thumb.thumbnail((size, size))
+        if thumb.mode not in ("RGB", "RGBA"):
+            transparent = "A" in thumb.getbands() or "transparency" in thumb.info
+            thumb = thumb.convert("RGBA" if transparent else "RGB")
+        staging = f"{dst}.{uuid4().hex}.part"
+        thumb.save(staging, "WEBP", quality=quality, method=4)
+    os.replace(staging, dst)
+    return True
@@ -0,0 +1,121 @@
+"""Server-side typing indicator state
+
+클라이언트의 typing 프레임을 그대로 방 전체에 뿌리지 않고, 사용자별 입력 상태를
+서버가 들고 있다가 상태가 바뀐(시작/중지) 방만 주기적으로 한 번씩
+{"type": "typing", "users": [...]} 로 알립니다.
+
+  - timeout      : 마지막 typing 프레임 이후 이 시간이 지나면 입력 중지로 간주
+  - min_interval : 사용자별로 이 간격보다 자주 오는 프레임은 무시 (rate limit)
+  - interval     : 방별 "누가 입력 중" 업데이트를 모아 보내는 주기
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TypingTracker:
+    def __init__(self, timeout: float = 4.0, min_interval: float = 1.0, interval: float = 0.5):
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.interval = interval
+        self.frames = 0        # 받은 typing 프레임
+        self.rate_limited = 0  # rate limit으로 무시한 프레임
+        self.suppressed = 0    # 방에 전달하지 않은 프레임 (rate limit + 상태 변화 없음)
+        self.updates = 0       # 보낸 방별 업데이트
+        self._typing: Dict[str, Dict[str, float]] = {}  # room -> {username: expires_at}
+        self._last_frame: Dict[Tuple[str, str], float] = {}
+        self._dirty: Set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def touch(self, room: str, username: str, now: float | None = None):
+        """typing 프레임 수신."""
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        key = (room, username)
+        if now - self._last_frame.get(key, float("-inf")) < self.min_interval:
+            self.rate_limited += 1
+            self.suppressed += 1
+            return
+        self._last_frame[key] = now
+        users = self._typing.setdefault(room, {})
+        if username not in users:
+            self._dirty.add(room)
+        else:
+            self.suppressed += 1
+        users[username] = now + self.timeout
+
+    def stop(self, room: str, username: str):
+        """메시지 전송·퇴장 등으로 입력이 끝났을 때."""
+        self._last_frame.pop((room, username), None)
+        users = self._typing.get(room)
+        if users and users.pop(username, None) is not None:
+            self._dirty.add(room)
+            if not users:
+                self._typing.pop(room, None)
+
+    def rename(self, room: str, old: str, new: str):
+        users = self._typing.get(room)
+        self._last_frame.pop((room, old), None)
+        if users and old in users:
+            users[new] = users.pop(old)
+            self._dirty.add(room)
+
+    def drop_room(self, room: str):
+        self._typing.pop(room, None)
+        self._dirty.discard(room)
+        for key in [k for k in self._last_frame if k[0] == room]:
+            del self._last_frame[key]
+
+    def users(self, room: str) -> List[str]:
+        return sorted(self._typing.get(room, {}))
+
+    def collect(self, now: float | None = None) -> Dict[str, List[str]]:
+        """만료를 처리하고, 상태가 바뀐 방의 현재 입력 중 사용자 목록을 반환합니다."""
+        now = time.monotonic() if now is None else now
+        for room, users in list(self._typing.items()):
+            expired = [u for u, expires in users.items() if expires <= now]
+            for username in expired:
+                del users[username]
+                self._last_frame.pop((room, username), None)
+            if expired:
+                self._dirty.add(room)
+            if not users:
+                del self._typing[room]
+        changed = {room: sorted(self._typing.get(room, {})) for room in self._dirty}
+        self._dirty.clear()
+        return changed
+
+    def start(self, send: Callable[[str, List[str]], Awaitable[None]]):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(send))
+
+    async def stop_task(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "frames": self.frames,
+            "rate_limited": self.rate_limited,
+            "suppressed": self.suppressed,
+            "updates": self.updates,
+            "typing_users": sum(len(u) for u in self._typing.values()),
+        }
+
+    async def _run(self, send: Callable[[str, List[str]], Awaitable[None]]):
+        while True:
+            await asyncio.sleep(self.interval)
+            for room, users in self.collect().items():
+                self.updates += 1
+                try:
+                    await send(room, users)
+                except Exception:
+                    logger.exception("typing: failed to send update for room %s", room)
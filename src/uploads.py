@@ -0,0 +1,712 @@
+"""Streaming upload pipeline and content-addressed storage
+
+UploadPipeline: 요청 본문을 청크 단위로 받아 임시 파일에 쓰고(파일 I/O는 스레드에서),
+받는 동안 SHA-256을 계산하며 크기·속도 제한을 적용합니다. 다 받으면 BlobStore에
+넘기고, 중간에 실패하거나 제한을 넘으면 임시 파일을 지웁니다.
+
+  - max_bytes       : 파일 하나의 최대 크기
+  - room_quota      : 방별 업로드 총량 상한 (0이면 무제한)
+  - rate / room_rate / client_rate: 전체·방별·클라이언트별 초당 수신 바이트 (0이면 무제한,
+    토큰 버킷으로 조절). 한도를 맞추려면 max_wait초보다 오래 기다려야 하면 429로 거부
+
+BlobStore: 파일 내용은 SHA-256별로 uploads/_blobs/<앞 2자리>/<sha256>에 한 번만 저장하고,
+/uploads/{room}/{name} 주소는 upload_refs 테이블로 blob에 연결합니다. 같은 파일을 여러 방에
+올려도 디스크에는 하나만 남고, 참조가 모두 사라지면 blob도 지웁니다. 예전 방식으로
+uploads/<room>/ 아래에 저장된 파일은 scan()이 백그라운드에서 blob으로 옮깁니다.
+참조 추가(put)와 blob 파일 배치, 참조 제거(release)와 파일 삭제는 각각 같은 DB 쓰기
+트랜잭션 안에서 하므로 여러 워커 프로세스 사이에서도 서로 끼어들지 않습니다. scan은 DB
+임대(lease)를 잡은 워커 하나만 실행합니다.
+
+ChunkedUploads: 큰 파일을 청크로 나눠 올리는 이어 올리기 세션. 세션을 만들면 파일 크기만큼의
+임시 파일을 잡아 두고, 각 청크는 offset 위치에 바로 씁니다(순서 무관, 병렬 가능). 받은 청크는
+DB에 기록되므로 연결이 끊겨도 빠진 청크만 다시 보내면 되고, complete에서 전체 SHA-256을
+확인한 뒤 BlobStore로 넘깁니다. ttl 동안 갱신이 없는 세션은 주기적으로 지웁니다.
+"""
+import asyncio
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from . import async_db, metrics
+from .database import RoomDeletedError
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER = 1024 * 1024  # 이만큼 모아서 스레드에 넘김
+MULTIPART_OVERHEAD = 64 * 1024  # multipart 본문에서 파일 외 부분(경계·헤더·다른 필드) 여유분
+BLOB_DIR_NAME = "_blobs"
+SCAN_LEASE = "blob_scan"
+SCAN_LEASE_TTL = 60.0
+CLIENT_BUCKETS_MAX = 10000  # 클라이언트별 속도 제한 버킷 수 (오래 안 쓴 것부터 버림)
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class StoredUpload:
+    __slots__ = ("path", "size", "sha256", "seconds", "deduped")
+
+    def __init__(self, path: str, size: int, sha256: str, seconds: float, deduped: bool = False):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.seconds = seconds
+        self.deduped = deduped  # 같은 내용의 blob이 이미 있었음
+
+    @property
+    def throughput(self) -> float:
+        """MB/s"""
+        return self.size / (1024 * 1024) / self.seconds if self.seconds > 0 else 0.0
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "tokens", "updated")
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate  # 1초 분량까지 버스트 허용
+        self.updated = time.monotonic()
+
+    def delay(self, size: int) -> float:
+        """size 바이트를 쓰기 전에 기다려야 하는 시간(초)."""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= size
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self, size: int):
+        self.tokens += size
+
+
+class UploadPipeline:
+    def __init__(self, store: "BlobStore", tmp_dir: str = os.path.join("data", "upload_tmp"),
+                 max_bytes: int = 50 * 1024 * 1024, room_quota: int = 0,
+                 rate: int = 0, room_rate: int = 0, client_rate: int = 0, max_wait: float = 2.0):
+        self.store = store
+        self.tmp_dir = tmp_dir
+        self.max_bytes = max_bytes
+        self.room_quota = room_quota
+        self.rate = rate
+        self.room_rate = room_rate
+        self.client_rate = client_rate
+        self.max_wait = max_wait
+        self.uploads = 0
+        self.bytes = 0
+        self.rejected = 0
+        self.active = 0
+        self.last_throughput = 0.0
+        self._global_bucket = _TokenBucket(rate) if rate > 0 else None
+        self._room_buckets: Dict[str, _TokenBucket] = {}
+        self._client_buckets: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+        self._room_usage: Dict[str, int] = {}
+
+    async def receive(self, room: str, name: str, chunks: AsyncIterator[bytes],
+                      client: str | None = None) -> StoredUpload:
+        """chunks를 /uploads/<room>/<name>으로 저장합니다. 제한을 넘으면 UploadError."""
+        loop = asyncio.get_running_loop()
+        limit = await self.limit(room)
+
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid4().hex}.part")
+        out = await loop.run_in_executor(None, open, tmp_path, "wb")
+        hasher = hashlib.sha256()
+        size = 0
+        pending: list = []
+        pending_size = 0
+        started = time.monotonic()
+        self.active += 1
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > limit:
+                    self.rejected += 1
+                    raise UploadError(413, "file too large" if limit == self.max_bytes
+                                      else "room upload quota exceeded")
+                await self._throttle(room, len(chunk), client)
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= WRITE_BUFFER:
+                    await loop.run_in_executor(None, _write, out, hasher, b"".join(pending))
+                    pending, pending_size = [], 0
+            if pending:
+                await loop.run_in_executor(None, _write, out, hasher, b"".join(pending))
+            await loop.run_in_executor(None, out.close)
+            sha256 = hasher.hexdigest()
+            final_path, deduped = await self.store.put(tmp_path, sha256, size, room, name)
+        except BaseException:
+            await loop.run_in_executor(None, _discard, out, tmp_path)
+            raise
+        finally:
+            self.active -= 1
+
+        upload = StoredUpload(final_path, size, sha256, time.monotonic() - started, deduped)
+        self.record(room, upload)
+        return upload
+
+    async def limit(self, room: str) -> int:
+        """지금 이 방에 올릴 수 있는 최대 크기. 방 할당량이 다 찼으면 UploadError."""
+        limit = self.max_bytes
+        if self.room_quota:
+            limit = min(limit, self.room_quota - await self._usage(room))
+            if limit <= 0:
+                self.rejected += 1
+                raise UploadError(413, "room upload quota exceeded")
+        return limit
+
+    def limit_body(self, receive: Callable, content_length: str | None) -> Callable:
+        """multipart 본문을 파싱하기 전에 크기를 제한하는 ASGI receive를 반환합니다.
+
+        방은 폼을 파싱해야 알 수 있으므로 여기서는 파일 크기 상한(+여유분)만 봅니다.
+        Content-Length가 상한을 넘으면 바로, 받는 동안 상한을 넘으면 그 순간 UploadError.
+        """
+        cap = self.max_bytes + MULTIPART_OVERHEAD
+        try:
+            declared = int(content_length) if content_length else None
+        except ValueError:
+            declared = None
+        if declared is not None and declared > cap:
+            self.rejected += 1
+            raise UploadError(413, "file too large")
+        received = 0
+
+        async def limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > cap:
+                    self.rejected += 1
+                    raise UploadError(413, "file too large")
+            return message
+        return limited
+
+    def record(self, room: str, upload: StoredUpload, kind: str = "stream"):
+        self._room_usage[room] = self._room_usage.get(room, 0) + upload.size
+        self.uploads += 1
+        self.bytes += upload.size
+        self.last_throughput = upload.throughput
+        metrics.upload_bytes.inc(kind, amount=upload.size)
+        metrics.upload_throughput.observe(upload.throughput, kind)
+
+    def forget_room(self, room: str):
+        self._room_usage.pop(room, None)
+        self._room_buckets.pop(room, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "uploads": self.uploads,
+            "bytes": self.bytes,
+            "rejected": self.rejected,
+            "active": self.active,
+            "last_throughput_mbps": round(self.last_throughput, 2),
+        }
+
+    async def _usage(self, room: str) -> int:
+        if not self.room_quota:
+            return 0
+        if room not in self._room_usage:
+            self._room_usage[room] = await async_db.get_room_upload_bytes(room)
+        return self._room_usage[room]
+
+    async def _throttle(self, room: str, size: int, client: str | None = None):
+        """한도에 맞게 잠깐 기다립니다. max_wait보다 오래 기다려야 하면 UploadError(429)."""
+        buckets = []
+        if self._global_bucket is not None:
+            buckets.append(self._global_bucket)
+        if self.room_rate > 0:
+            bucket = self._room_buckets.get(room)
+            if bucket is None:
+                bucket = self._room_buckets[room] = _TokenBucket(self.room_rate)
+            buckets.append(bucket)
+        if self.client_rate > 0 and client:
+            buckets.append(self._client_bucket(client))
+        wait = max((bucket.delay(size) for bucket in buckets), default=0.0)
+        if wait > self.max_wait:
+            for bucket in buckets:
+                bucket.refund(size)  # 받지 않은 바이트로 다른 업로드가 밀리지 않도록
+            self.rejected += 1
+            raise UploadError(429, "upload rate limit exceeded")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _client_bucket(self, client: str) -> _TokenBucket:
+        bucket = self._client_buckets.get(client)
+        if bucket is None:
+            bucket = self._client_buckets[client] = _TokenBucket(self.client_rate)
+            if len(self._client_buckets) > CLIENT_BUCKETS_MAX:
+                self._client_buckets.popitem(last=False)
+        else:
+            self._client_buckets.move_to_end(client)
+        return bucket
+
+
+class BlobStore:
+    def __init__(self, root: str = "uploads", ref_cache_size: int = 10000):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOB_DIR_NAME)
+        self.ref_cache_size = ref_cache_size
+        self.deduped = 0          # 업로드 시 이미 있던 blob을 재사용한 횟수
+        self.scanned = 0          # scan()이 옮긴 예전 파일 수
+        self.scan_saved_bytes = 0  # scan()으로 줄어든 디스크 사용량
+        self.scanning = False
+        self.derived_suffixes: List[str] = []  # blob 옆에 만드는 파생 파일(<sha256><suffix>)
+        self._refs: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self.worker_id = f"{os.getpid()}-{uuid4().hex[:6]}"
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    async def put(self, tmp_path: str, sha256: str, size: int, room: str, name: str) -> Tuple[str, bool]:
+        """room/name 참조를 추가하고, 같은 트랜잭션 안에서 임시 파일을 blob으로 옮깁니다(이미 있으면 버림)."""
+        path = self.path_for(sha256)
+        try:
+            deduped = await async_db.add_upload_ref(room, name, sha256, size,
+                                                    place=partial(_place, tmp_path, path))
+        except RoomDeletedError:
+            raise UploadError(404, "room not found")
+        if deduped:
+            self.deduped += 1
+        self._remember(room, name, sha256)
+        return path, deduped
+
+    async def resolve(self, room: str, name: str) -> Tuple[str, str | None] | None:
+        """/uploads/{room}/{name}의 (실제 파일 경로, sha256). 없으면 None.
+
+        아직 blob으로 옮기지 않은 예전 파일은 sha256이 None입니다.
+        """
+        if not _safe_segment(room) or not _safe_segment(name) or room == BLOB_DIR_NAME:
+            return None
+        sha256 = self._refs.get((room, name))
+        if sha256 is None:
+            sha256 = await async_db.get_upload_ref(room, name)
+            if sha256 is not None:
+                self._remember(room, name, sha256)
+        if sha256 is not None:
+            return self.path_for(sha256), sha256
+        # 아직 blob으로 옮기지 않은 예전 파일
+        legacy = os.path.join(self.root, room, name)
+        return (legacy, None) if os.path.isfile(legacy) else None
+
+    async def release(self, room: str, names: List[str] | None = None) -> int:
+        """방의 참조(names가 없으면 전부)를 지우고 더 이상 쓰이지 않는 blob 파일을 삭제합니다."""
+        orphans = await async_db.remove_upload_refs(room, names, remove_blobs=self._remove_blobs)
+        for key in [k for k in self._refs if k[0] == room and (names is None or k[1] in names)]:
+            del self._refs[key]
+        return len(orphans)
+
+    async def drop_room(self, room: str) -> int:
+        """삭제된 방: 모든 참조를 지우고(쓰이지 않게 된 blob 삭제) 예전 방식의 uploads/<room>/도 지웁니다."""
+        released = await self.release(room)
+        if _safe_segment(room) and room != BLOB_DIR_NAME:
+            await asyncio.get_running_loop().run_in_executor(
+                None, partial(shutil.rmtree, os.path.join(self.root, room), ignore_errors=True))
+        return released
+
+    async def scan(self, remove_originals: bool = False):
+        """uploads/<room>/ 아래 예전 파일을 해시해 blob으로 옮기고 중복을 제거합니다.
+
+        remove_originals가 False면 원본은 그대로 두고(주소는 blob으로 연결) 다음 scan에서 건너뜁니다.
+        여러 워커가 동시에 시작해도 임대를 잡은 워커 하나만 실행합니다.
+        """
+        if self.scanning or not await async_db.claim_lease(SCAN_LEASE, self.worker_id, SCAN_LEASE_TTL):
+            return
+        self.scanning = True
+        loop = asyncio.get_running_loop()
+        renewed = time.monotonic()
+        try:
+            for room, name, path in await loop.run_in_executor(None, self._legacy_files):
+                if time.monotonic() - renewed > SCAN_LEASE_TTL / 3:
+                    if not await async_db.claim_lease(SCAN_LEASE, self.worker_id, SCAN_LEASE_TTL):
+                        return  # 임대를 잃음: 다른 워커가 이어서 처리
+                    renewed = time.monotonic()
+                try:
+                    if await async_db.get_upload_ref(room, name) is None:
+                        sha256, size = await loop.run_in_executor(None, _hash_file, path)
+                        existed = await async_db.add_upload_ref(
+                            room, name, sha256, size, place=partial(_link_or_copy, path, self.path_for(sha256)))
+                        if existed and remove_originals:
+                            self.scan_saved_bytes += size
+                        self._remember(room, name, sha256)
+                        self.scanned += 1
+                    if remove_originals:
+                        # 참조가 생긴 뒤에 지워야 그 사이 요청도 파일을 찾음
+                        await loop.run_in_executor(None, _remove_files, [path])
+                except (FileNotFoundError, RoomDeletedError):
+                    pass  # 다른 워커가 먼저 처리했거나 삭제 정리 중인 방
+                except Exception:
+                    logger.exception("blob scan: failed to migrate %s", path)
+        finally:
+            self.scanning = False
+            await async_db.release_lease(SCAN_LEASE, self.worker_id)
+
+    async def stats(self) -> Dict[str, int]:
+        return {**await async_db.get_upload_stats(), "deduped": self.deduped,
+                "scanned": self.scanned, "scan_saved_bytes": self.scan_saved_bytes}
+
+    def _remove_blobs(self, orphans: List[str]):
+        # remove_upload_refs의 트랜잭션 안(DB 스레드)에서 실행
+        _remove_files([self.path_for(sha) + suffix for sha in orphans for suffix in ["", *self.derived_suffixes]])
+
+    def _remember(self, room: str, name: str, sha256: str):
+        self._refs[(room, name)] = sha256
+        self._refs.move_to_end((room, name))
+        while len(self._refs) > self.ref_cache_size:
+            self._refs.popitem(last=False)
+
+    def _legacy_files(self) -> List[Tuple[str, str, str]]:
+        files = []
+        if not os.path.isdir(self.root):
+            return files
+        for room in os.listdir(self.root):
+            room_dir = os.path.join(self.root, room)
+            if room == BLOB_DIR_NAME or not os.path.isdir(room_dir):
+                continue
+            for name in os.listdir(room_dir):
+                path = os.path.join(room_dir, name)
+                if os.path.isfile(path) and not name.endswith(".part"):
+                    files.append((room, name, path))
+        return files
+
+
+class ChunkedUploads:
+    def __init__(self, pipeline: UploadPipeline, chunk_size: int = 4 * 1024 * 1024,
+                 ttl: float = 24 * 3600):
+        self.pipeline = pipeline
+        self.chunk_size = max(64 * 1024, chunk_size)
+        self.ttl = ttl
+        self.created = 0
+        self.completed = 0
+        self.expired = 0
+        self.chunks = 0
+        self.chunk_bytes = 0
+        self.checksum_failures = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._expire_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def create(self, room: str, username: str, filename: str, size: int,
+                     sha256: str | None = None) -> Dict[str, Any]:
+        if size <= 0:
+            raise UploadError(400, "size must be positive")
+        if size > await self.pipeline.limit(room):
+            self.pipeline.rejected += 1
+            raise UploadError(413, "file too large" if size > self.pipeline.max_bytes
+                              else "room upload quota exceeded")
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+                raise UploadError(400, "invalid sha256")
+        upload_id = uuid4().hex
+        os.makedirs(self.pipeline.tmp_dir, exist_ok=True)
+        await asyncio.get_running_loop().run_in_executor(None, _allocate, self._tmp_path(upload_id), size)
+        await async_db.create_upload_session(upload_id, room, username, filename, size,
+                                             self.chunk_size, sha256, time.time())
+        self.created += 1
+        return await self.status(upload_id)
+
+    async def status(self, upload_id: str) -> Dict[str, Any]:
+        """세션 상태와 이미 받은 청크의 offset 목록. 클라이언트는 빠진 청크만 다시 보냅니다."""
+        session = await self._session(upload_id)
+        return {
+            "upload_id": upload_id,
+            "size": session["size"],
+            "chunk_size": session["chunk_size"],
+            "received": [idx * session["chunk_size"] for idx in session["chunks"]],
+            "state": session["state"],
+            "expires_at": session["updated_at"] + self.ttl,
+        }
+
+    async def put_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes],
+                        checksum: str | None = None, client: str | None = None) -> Dict[str, Any]:
+        """offset 위치의 청크 하나를 받아 임시 파일에 씁니다. checksum은 청크의 SHA-256(선택)."""
+        session = await self._session(upload_id)
+        if session["state"] != "open":
+            raise UploadError(409, "upload is completing")
+        chunk_size, size = session["chunk_size"], session["size"]
+        if offset < 0 or offset >= size or offset % chunk_size:
+            raise UploadError(400, "invalid offset")
+        expected = min(chunk_size, size - offset)
+
+        room = session["room"]
+        parts: list = []
+        received = 0
+        self.pipeline.active += 1
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                received += len(chunk)
+                if received > expected:
+                    raise UploadError(413, "chunk too large")
+                await self.pipeline._throttle(room, len(chunk), client)
+                parts.append(chunk)
+        finally:
+            self.pipeline.active -= 1
+        if received != expected:
+            raise UploadError(400, "incomplete chunk")
+        data = b"".join(parts)
+        if checksum is not None and hashlib.sha256(data).hexdigest() != checksum.lower():
+            self.checksum_failures += 1
+            raise UploadError(422, "chunk checksum mismatch")
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, _write_at, self._tmp_path(upload_id), offset, data)
+        except FileNotFoundError:
+            # complete()가 파일을 가져갔거나 그 사이 만료됨
+            await self._session(upload_id)
+            raise UploadError(409, "upload is completing")
+        if not await async_db.add_upload_chunk(upload_id, offset // chunk_size, time.time()):
+            raise UploadError(409, "upload is completing")
+        self.chunks += 1
+        self.chunk_bytes += received
+        return {"ok": True, "offset": offset, "size": received}
+
+    async def complete(self, upload_id: str, name_for: Callable[[str], str]) -> Tuple[Dict[str, Any], str, StoredUpload]:
+        """모든 청크를 받았으면 전체 해시를 확인하고 blob으로 저장합니다.
+
+        (세션, 저장한 이름, StoredUpload)를 반환합니다. 저장 이름은 name_for(원래 파일명).
+        """
+        session = await self._session(upload_id)
+        total = -(-session["size"] // session["chunk_size"])
+        if len(session["chunks"]) < total:
+            raise UploadError(409, f"missing {total - len(session['chunks'])} chunk(s)")
+        # 같은 세션을 동시에 완료하지 않도록 상태를 먼저 바꿈
+        if not await async_db.set_upload_session_state(upload_id, "completing", "open"):
+            raise UploadError(409, "upload is completing")
+
+        # 아직 진행 중인 PUT이 해시 계산 뒤에 쓰지 못하도록 다른 이름의 복사본을 만들고,
+        # 그 복사본에 실제로 쓴 바이트로 해시를 계산해 blob으로 넘김
+        loop = asyncio.get_running_loop()
+        tmp_path = self._tmp_path(upload_id)
+        sealed = tmp_path + ".sealed"
+        try:
+            sha256, size = await loop.run_in_executor(None, _seal, tmp_path, sealed)
+        except FileNotFoundError:
+            await async_db.delete_upload_session(upload_id)
+            raise UploadError(404, "upload not found")
+        if size != session["size"] or (session["sha256"] and sha256 != session["sha256"]):
+            # 어느 청크가 잘못됐는지 알 수 없으므로 세션을 버리고 처음부터 다시 올려야 함
+            self.checksum_failures += 1
+            await loop.run_in_executor(None, _remove_files, [sealed])
+            await self._drop(upload_id)
+            raise UploadError(422, "checksum mismatch")
+
+        room, name = session["room"], name_for(session["filename"])
+        try:
+            path, deduped = await self.pipeline.store.put(sealed, sha256, size, room, name)
+        except BaseException:
+            # 복사본은 모든 청크를 담고 있으므로 되돌려 두면 다시 complete할 수 있음
+            await loop.run_in_executor(None, _restore, sealed, tmp_path)
+            await async_db.set_upload_session_state(upload_id, "open", "completing")
+            raise
+        await async_db.delete_upload_session(upload_id)
+        upload = StoredUpload(path, size, sha256, time.time() - session["created_at"], deduped)
+        self.pipeline.record(room, upload, kind="chunked")
+        self.completed += 1
+        return session, name, upload
+
+    async def abort(self, upload_id: str):
+        await self._session(upload_id)
+        await self._drop(upload_id)
+
+    async def expire(self) -> int:
+        """ttl 동안 갱신이 없는 세션과 남은 임시 파일을 지웁니다."""
+        cutoff = time.time() - self.ttl
+        ids = await async_db.expire_upload_sessions(cutoff)
+        await asyncio.get_running_loop().run_in_executor(
+            None, _remove_stale, self.pipeline.tmp_dir, [self._tmp_path(i) for i in ids], cutoff)
+        self.expired += len(ids)
+        return len(ids)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chunk_size": self.chunk_size,
+            "created": self.created,
+            "completed": self.completed,
+            "expired": self.expired,
+            "chunks": self.chunks,
+            "chunk_bytes": self.chunk_bytes,
+            "checksum_failures": self.checksum_failures,
+        }
+
+    async def _session(self, upload_id: str) -> Dict[str, Any]:
+        session = await async_db.get_upload_session(upload_id) if _safe_segment(upload_id) else None
+        if session is None:
+            raise UploadError(404, "upload not found")
+        return session
+
+    async def _drop(self, upload_id: str):
+        await async_db.delete_upload_session(upload_id)
+        await asyncio.get_running_loop().run_in_executor(None, _remove_files, [self._tmp_path(upload_id)])
+
+    def _tmp_path(self, upload_id: str) -> str:
+        return os.path.join(self.pipeline.tmp_dir, f"{upload_id}.chunked")
+
+    async def _expire_loop(self):
+        interval = max(1.0, min(self.ttl / 4, 600.0))
+        while True:
+            try:
+                await self.expire()
+            except Exception:
+                logger.exception("chunked uploads: failed to expire sessions")
+            await asyncio.sleep(interval)
+
+
+# --- 스레드에서 실행 ---
+
+def _write(out, hasher, data: bytes):
+    hasher.update(data)
+    out.write(data)
+
+
+def _allocate(path: str, size: int):
+    with open(path, "wb") as f:
+        f.truncate(size)  # 대부분의 파일시스템에서 희소 파일
+
+
+def _write_at(path: str, offset: int, data: bytes):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def _seal(path: str, sealed: str) -> Tuple[str, int]:
+    """path를 옮겨 새 쓰기를 막고, sealed로 복사하면서 복사한 내용의 (sha256, 크기)를 계산합니다.
+
+    옮기기 전에 이미 파일을 연 쓰기가 늦게 끝나도 sealed에는 영향이 없습니다.
+    """
+    taken = f"{path}.{uuid4().hex}.taken"
+    os.replace(path, taken)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(taken, "rb") as f, open(sealed, "wb") as out:
+            while True:
+                data = f.read(WRITE_BUFFER)
+                if not data:
+                    break
+                hasher.update(data)
+                out.write(data)
+                size += len(data)
+    except BaseException:
+        _remove_files([sealed])
+        os.replace(taken, path)
+        raise
+    os.remove(taken)
+    return hasher.hexdigest(), size
+
+
+def _restore(sealed: str, path: str):
+    try:
+        os.replace(sealed, path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_stale(tmp_dir: str, paths: List[str], cutoff: float):
+    """만료된 세션 파일과, 중단된 업로드가 남긴 cutoff 이전의 임시 파일을 지웁니다."""
+    _remove_files(paths)
+    if not os.path.isdir(tmp_dir):
+        return
+    for name in os.listdir(tmp_dir):
+        path = os.path.join(tmp_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _move(tmp_path: str, final_path: str):
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    try:
+        os.replace(tmp_path, final_path)  # 같은 파일시스템이면 원자적
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 다른 파일시스템: 대상 디렉터리에 복사한 뒤 그 안에서 rename
+        staging = final_path + ".part"
+        shutil.copyfile(tmp_path, staging)
+        os.replace(staging, final_path)
+        os.remove(tmp_path)
+
+
+def _place(tmp_path: str, blob_path: str):
+    if os.path.exists(blob_path):
+        os.remove(tmp_path)  # 같은 내용이 이미 저장되어 있음
+    else:
+        _move(tmp_path, blob_path)
+
+
+def _link_or_copy(path: str, blob_path: str) -> bool:
+    """예전 파일을 blob 위치에 연결합니다. 새 blob을 만들었으면 True, 이미 있었으면 False."""
+    if os.path.exists(blob_path):
+        return False
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    staging = f"{blob_path}.{uuid4().hex}.part"
+    try:
+        os.link(path, staging)
+    except OSError:
+        shutil.copyfile(path, staging)
+    os.replace(staging, blob_path)
+    return True
+
+
+def _hash_file(path: str) -> Tuple[str, int]:
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(WRITE_BUFFER)
+            if not data:
+                break
+            hasher.update(data)
+            size += len(data)
+    return hasher.hexdigest(), size
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _safe_segment(value: str) -> bool:
+    return bool(value) and value not in (".", "..") and "/" not in value and "\\" not in value and "\0" not in value
+
+
+def _discard(out, tmp_path: str):
+    try:
+        out.close()
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
@@ -8,6 +8,11 @@ function initChat({room, name, password, hooks={}}) {
   let typingTimer = null;
   let typingUsers = new Set(); // Track who's typing
   let currentPinnedId = null; // Pinned message id (room-scoped)
+  let oldestId = null; // 화면에 있는 가장 오래된 메시지 id (이전 페이지 로드 기준)
+  let lastSeenId = null; // 받은 가장 최근 메시지 id (재연결 시 delta 동기화 기준)
+  let presenceVersion = null; // 참가자 목록 버전 (presence 변화분 적용 기준)
+  let hasMoreHistory = true;
+  let loadingHistory = false;
 
   const colorPicker = document.getElementById('nameColor');
   if (colorPicker) {
@@ -35,6 +40,7 @@ function initChat({room, name, password, hooks={}}) {
   const dropOverlay = document.getElementById('drop-overlay');
   const searchInput = document.getElementById('searchInput');
   const clearSearch = document.getElementById('clearSearch');
+  const searchResults = document.getElementById('searchResults');
 
   // Pinned message bar (in right pane, above controls)
   const rightPane = document.querySelector('main.right');
@@ -144,9 +150,11 @@ function initChat({room, name, password, hooks={}}) {
     }
   }
 
-  function addLine(html){
+  // into: 과거 메시지를 모아 둘 DocumentFragment (없으면 #log에 바로 추가하고 스크롤)
+  function addLine(html, into){
     const div = document.createElement('div');
     div.innerHTML = html;
+    if (into) { into.appendChild(div); return; }
     log.appendChild(div);
     log.scrollTop = log.scrollHeight;
   }
@@ -345,6 +353,21 @@ function initChat({room, name, password, hooks={}}) {
   // Global function to show context menu
   window.showMessageMenu = showContextMenu;
 
+  // Participant list items
+  function participantItem(user) {
+    const li = document.createElement('li');
+    li.style.margin = '4px 0';
+    li.dataset.user = user;
+    if (user === myName) li.innerHTML = `<b>${esc(user)} (나)</b>`;
+    else li.textContent = user;
+    return li;
+  }
+  function updateParticipantCount() {
+    const pList = document.getElementById('participant-list');
+    const pCount = document.getElementById('p-count');
+    if (pList && pCount) pCount.textContent = pList.children.length;
+  }
+
   // Show typing indicator
   function updateTypingIndicator() {
     let indicator = document.getElementById('typing-indicator');
@@ -372,7 +395,10 @@ function initChat({room, name, password, hooks={}}) {
     ws.onopen = () => {
       reconnectAttempts = 0;
       showStatus('✅ 연결됨', 'success');
-      ws.send(JSON.stringify({type:"join", room, username:myName, password, color: myColor}));
+      presenceVersion = null; // 입장 시 받을 스냅샷 전까지 변화분 무시
+      const join = {type:"join", room, username:myName, password, color: myColor};
+      if (lastSeenId !== null) join.last_id = lastSeenId; // 놓친 메시지만 받기
+      ws.send(JSON.stringify(join));
       if (window.Notification && Notification.permission === 'default') Notification.requestPermission();
     };
 
@@ -410,8 +436,11 @@ function initChat({room, name, password, hooks={}}) {
   // Initial connection
   connectWebSocket();
 
-  function handlePayload(d) {
+  // into가 주어지면 이전 페이지 렌더링: 알림/안 읽음 카운트 없이 fragment에 추가
+  function handlePayload(d, into) {
     if (!d || !d.type) return;
+    if (d.id && (oldestId === null || d.id < oldestId)) oldestId = d.id;
+    if (d.id && (lastSeenId === null || d.id > lastSeenId)) lastSeenId = d.id;
     if (d.type === 'error') {
       alert('입장 실패: ' + (d.message || '오류'));
       location.href = '/';
@@ -419,11 +448,17 @@ function initChat({room, name, password, hooks={}}) {
     }
     if (d.type === 'system') {
       const stamp = renderTimestamp(d.timestamp);
-      addLine(`<div class="sys">${stamp}<span>[알림] ${esc(d.message || '')}</span></div>`);
-      bumpUnread();
+      addLine(`<div class="sys">${stamp}<span>[알림] ${esc(d.message || '')}</span></div>`, into);
+      if (!into) bumpUnread();
       return;
     }
     if (d.type === 'typing') {
+      // 서버가 방 단위로 모아 보내는 "현재 입력 중인 사용자" 목록
+      if (Array.isArray(d.users)) {
+        typingUsers = new Set(d.users.filter(u => u !== myName));
+        updateTypingIndicator();
+        return;
+      }
       if (d.from && d.from !== myName) {
         typingUsers.add(d.from);
         updateTypingIndicator();
@@ -435,10 +470,31 @@ function initChat({room, name, password, hooks={}}) {
       }
       return;
     }
+    if (d.type === 'history') {
+      // delta: 재연결 중 놓친 메시지만 이어 붙임 / full·reset: 화면을 비우고 다시 그림
+      if (d.mode !== 'delta') {
+        log.innerHTML = '';
+        oldestId = null;
+        hasMoreHistory = d.has_more !== false;
+      }
+      // 과거 메시지 전체를 한 번의 DOM 삽입으로 렌더링
+      const frag = document.createDocumentFragment();
+      (d.messages || []).forEach(m => handlePayload(m, frag));
+      log.appendChild(frag);
+      log.scrollTop = log.scrollHeight;
+      renderPinned(d.pinned && d.pinned.msg_id ? d.pinned : null);
+      return;
+    }
     if (d.type === 'pin_update') {
       renderPinned(d.msg_id ? d : null);
       return;
     }
+    if (d.type === 'thumb_update') {
+      // 업로드 알림 뒤에 만들어진 썸네일로 교체
+      const img = document.querySelector(`[data-msg-id="${d.msg_id}"] img.file-thumb`);
+      if (img && d.thumb_url) img.src = d.thumb_url;
+      return;
+    }
     if (d.type === 'reaction_update') {
       // Update existing message reactions
       const msgElement = document.querySelector(`[data-msg-id="${d.msg_id}"]`);
@@ -461,7 +517,8 @@ function initChat({room, name, password, hooks={}}) {
       // Reply context
       let replyHtml = '';
       if (d.reply_to_id) {
-        const replyMsg = document.querySelector(`[data-msg-id="${d.reply_to_id}"]`);
+        const replySelector = `[data-msg-id="${d.reply_to_id}"]`;
+        const replyMsg = (into && into.querySelector(replySelector)) || document.querySelector(replySelector);
         if (replyMsg) {
           const replyText = replyMsg.getAttribute('data-msg-text') || '';
           const replyFrom = replyMsg.getAttribute('data-msg-from') || '';
@@ -482,8 +539,9 @@ function initChat({room, name, password, hooks={}}) {
       addLine(`<div class="chatline ${self?'me':''}" data-msg-id="${d.id || ''}" data-msg-from="${esc(d.from)}" data-msg-text="${esc(d.message)}" style="margin-bottom:8px;display:block;padding:6px;border-radius:8px;transition:background 0.15s;" oncontextmenu="window.showMessageMenu(event, ${d.id}, '${esc(d.from)}', '${escapedMsg}'); return false;" onmouseover="this.style.background='#f8f9fa'" onmouseout="this.style.background='transparent'">
         <div style="display:flex;align-items:flex-end;gap:6px;">${stamp}${label}: <span class="bubble">${replyHtml}${messageHtml}</span></div>
         ${reactionsHtml}
-      </div>`);
+      </div>`, into);
 
+      if (into) return;
       if (!self) bumpUnread();
 
       // HTTP-compatible @mention notification
@@ -505,29 +563,48 @@ function initChat({room, name, password, hooks={}}) {
       const isImage = /\.(jpe?g|png|gif|webp|bmp|svg)$/i.test(d.filename || '');
       let fileElement;
       if (isImage) {
+        // 썸네일이 있으면 작은 버전을 보여주고, 클릭하면 원본
         fileElement = `<a href="${esc(d.url)}" target="_blank" rel="noopener">
-                         <img src="${esc(d.url)}" alt="${esc(d.filename)}" style="max-width: 300px; max-height: 250px; border-radius: 8px; margin-top: 4px; display: block;">
+                         <img class="file-thumb" src="${esc(d.thumb_url || d.url)}" alt="${esc(d.filename)}" loading="lazy" style="max-width: 300px; max-height: 250px; border-radius: 8px; margin-top: 4px; display: block;">
                        </a>`;
       } else {
         fileElement = `📎 <a href="${esc(d.url)}" target="_blank" rel="noopener">${esc(d.filename || '파일')}</a>`;
       }
-      addLine(`<div class="chatline ${self?'me':''}">${stamp}${label}: ${fileElement}</div>`);
-      if (!self) bumpUnread();
+      addLine(`<div class="chatline ${self?'me':''}" data-msg-id="${d.id || ''}">${stamp}${label}: ${fileElement}</div>`, into);
+      if (!self && !into) bumpUnread();
       return;
     }
     if (d.type === 'participants') {
+      // 전체 스냅샷 (입장 직후 또는 버전 누락 시 재요청한 경우)
       const pList = document.getElementById('participant-list');
-      const pCount = document.getElementById('p-count');
-      if (!pList || !pCount) return;
-      pCount.textContent = d.users.length;
+      if (!pList) return;
+      presenceVersion = d.version || 0;
       pList.innerHTML = '';
-      d.users.forEach(user => {
-        const li = document.createElement('li');
-        li.style.margin = '4px 0';
-        if (user === myName) li.innerHTML = `<b>${esc(user)} (나)</b>`;
-        else li.textContent = esc(user);
-        pList.appendChild(li);
-      });
+      d.users.forEach(user => pList.appendChild(participantItem(user)));
+      updateParticipantCount();
+      return;
+    }
+    if (d.type === 'presence') {
+      // 참가자 변화분만 적용: 버전이 이어지지 않으면 스냅샷 요청
+      const pList = document.getElementById('participant-list');
+      if (!pList || presenceVersion === null || d.version <= presenceVersion) return;
+      if (d.version !== presenceVersion + 1) {
+        presenceVersion = null;
+        if (ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({type: 'participants'}));
+        return;
+      }
+      presenceVersion = d.version;
+      if (d.op === 'join') {
+        const next = Array.from(pList.children).find(li => li.dataset.user > d.user);
+        pList.insertBefore(participantItem(d.user), next || null);
+      } else if (d.op === 'leave') {
+        const li = pList.querySelector(`li[data-user="${CSS.escape(d.user)}"]`);
+        if (li) li.remove();
+      } else if (d.op === 'rename') {
+        const li = pList.querySelector(`li[data-user="${CSS.escape(d.old)}"]`);
+        if (li) li.replaceWith(participantItem(d.user));
+      }
+      updateParticipantCount();
       return;
     }
     if (d.type === 'pong') {
@@ -537,6 +614,33 @@ function initChat({room, name, password, hooks={}}) {
 
   ws.onclose = () => addLine(`<div class="sys">[알림] 서버와 연결이 종료되었습니다.</div>`);
 
+  // --- Infinite scroll-back: 맨 위로 스크롤하면 이전 메시지 페이지를 불러옴 ---
+  async function loadOlderMessages() {
+    if (loadingHistory || !hasMoreHistory || oldestId === null) return;
+    loadingHistory = true;
+    try {
+      const res = await fetch(`/api/rooms/${encodeURIComponent(room)}/messages?before_id=${oldestId}&limit=50`, {
+        headers: { 'X-Room-Password': encodeURIComponent(password) }
+      });
+      if (!res.ok) { hasMoreHistory = false; return; }
+      const data = await res.json();
+      hasMoreHistory = !!data.has_more;
+      const frag = document.createDocumentFragment();
+      (data.messages || []).forEach(m => handlePayload(m, frag));
+      // 스크롤 위치 유지: 추가된 높이만큼 내려줌
+      const prevHeight = log.scrollHeight;
+      log.insertBefore(frag, log.firstChild);
+      log.scrollTop += log.scrollHeight - prevHeight;
+    } catch (e) {
+      console.error('Failed to load older messages:', e);
+    } finally {
+      loadingHistory = false;
+    }
+  }
+  log.addEventListener('scroll', () => {
+    if (log.scrollTop < 40) loadOlderMessages();
+  });
+
   btn.onclick = async () => {
     const text = msg.value.trim();
     if (!text) return;
@@ -556,8 +660,8 @@ function initChat({room, name, password, hooks={}}) {
   // Send typing indicator
   msg.addEventListener('input', () => {
     if (!ws || ws.readyState !== WebSocket.OPEN) return;
-    // Debounce typing event
-    if (typingTimer) clearTimeout(typingTimer);
+    // Throttle typing event: 1초에 한 번만 (서버가 입력 중 상태를 유지)
+    if (typingTimer) return;
     ws.send(JSON.stringify({type: 'typing'}));
     typingTimer = setTimeout(() => {
       typingTimer = null;
@@ -565,23 +669,104 @@ function initChat({room, name, password, hooks={}}) {
   });
 
   // --- File upload primitive ---
-  const MAX_IMAGE_BYTES = 25 * 1024 * 1024; // safety cap
+  // 크기·할당량 제한은 서버가 확인 (413이면 detail을 그대로 보여줌)
+  const CHUNKED_THRESHOLD = 8 * 1024 * 1024; // 이보다 큰 파일은 청크로 나눠 이어 올리기
+  const CHUNK_PARALLEL = 3;
   async function sendFile(file) {
     if (!file) return;
-    if (file.size > MAX_IMAGE_BYTES) { alert('파일이 너무 큽니다.'); return; }
-    const fd = new FormData();
-    fd.append('room', room);
-    fd.append('username', myName);
-    fd.append('file', file);
     try {
-      const res = await fetch('/api/upload', { method:'POST', body: fd });
-      if (!res.ok) {
-        const e = await res.json().catch(()=>({detail:'unknown'}));
-        alert('업로드 실패: ' + (e.detail || res.status));
+      if (file.size > CHUNKED_THRESHOLD) { await sendFileChunked(file); return; }
+      // 파일 바이트를 본문으로 그대로 보내 서버가 스트리밍으로 저장 (multipart 파싱 없음)
+      const params = new URLSearchParams({room, username: myName, filename: file.name || 'file'});
+      await uploadJSON(`/api/upload?${params}`, {
+        method: 'POST',
+        body: file,
+        headers: { 'Content-Type': 'application/octet-stream' }
+      });
+    } catch (e) {
+      alert(e.status ? '업로드 실패: ' + e.message : '업로드 중 에러 발생: ' + e.message);
+    }
+  }
+
+  async function uploadJSON(url, options) {
+    const res = await fetch(url, options);
+    const body = await res.json().catch(()=>({}));
+    if (!res.ok) {
+      const err = new Error(body.detail || res.status);
+      err.status = res.status;
+      throw err;
+    }
+    return body;
+  }
+
+  function waitOnline() {
+    if (navigator.onLine) return Promise.resolve();
+    return new Promise(resolve => window.addEventListener('online', resolve, {once: true}));
+  }
+
+  // 네트워크 오류·5xx는 다시 연결될 때까지 기다렸다가 재시도, 그 밖의 4xx는 바로 실패
+  async function withRetry(fn, retryable = [408, 429]) {
+    for (let attempt = 0; ; attempt++) {
+      try { return await fn(); }
+      catch (e) {
+        if ((e.status && e.status < 500 && !retryable.includes(e.status)) || attempt >= 8) throw e;
+        await waitOnline();
+        await new Promise(r => setTimeout(r, Math.min(30000, 500 * 2 ** attempt)));
+      }
+    }
+  }
+
+  async function chunkSha256(blob) {
+    if (!(window.crypto && crypto.subtle)) return null; // 비보안(HTTP) 페이지에서는 생략
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function sendFileChunked(file) {
+    // 같은 파일을 다시 고르면 저장해 둔 세션에서 빠진 청크만 이어서 보냄
+    const key = `upload:${room}:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+    const saved = localStorage.getItem(key);
+    if (saved) {
+      session = await withRetry(() => uploadJSON(`/api/uploads/${saved}`)).catch(() => null);
+      if (session && session.state !== 'open') session = null;
+    }
+    if (!session) {
+      session = await withRetry(() => uploadJSON('/api/uploads', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({room, username: myName, filename: file.name || 'file', size: file.size})
+      }));
+      localStorage.setItem(key, session.upload_id);
+    }
+
+    const id = session.upload_id, chunkSize = session.chunk_size;
+    const received = new Set(session.received);
+    const pending = [];
+    for (let offset = 0; offset < file.size; offset += chunkSize) {
+      if (!received.has(offset)) pending.push(offset);
+    }
+    async function worker() {
+      while (pending.length) {
+        const offset = pending.shift();
+        const blob = file.slice(offset, offset + chunkSize);
+        const headers = {'Content-Type': 'application/octet-stream'};
+        const checksum = await chunkSha256(blob);
+        if (checksum) headers['X-Chunk-SHA256'] = checksum;
+        // 잘린 청크(400)·체크섬 불일치(422)도 다시 보내면 되는 오류
+        await withRetry(() => uploadJSON(`/api/uploads/${id}?offset=${offset}`,
+          {method: 'PUT', headers, body: blob}), [400, 408, 422, 429]);
       }
+    }
+    await Promise.all(Array.from({length: Math.min(CHUNK_PARALLEL, pending.length)}, worker));
+
+    try {
+      await withRetry(() => uploadJSON(`/api/uploads/${id}/complete`, {method: 'POST'}));
     } catch (e) {
-      alert('업로드 중 에러 발생: ' + e.message);
+      if (e.status === 404 || e.status === 422) localStorage.removeItem(key); // 세션이 사라짐 → 다음엔 처음부터
+      throw e;
     }
+    localStorage.removeItem(key);
   }
 
   async function uploadFile(){
@@ -714,6 +899,69 @@ function initChat({room, name, password, hooks={}}) {
       }
     });
 
+    // 서버 검색: 방 전체 기록에서 찾기 (입력이 멈춘 뒤 300ms)
+    let searchTimer = null;
+    let searchSeq = 0;
+    async function runServerSearch(query, beforeId) {
+      if (!searchResults) return;
+      const seq = ++searchSeq;
+      let url = `/api/rooms/${encodeURIComponent(room)}/search?q=${encodeURIComponent(query)}&limit=20`;
+      if (beforeId) url += `&before_id=${beforeId}`;
+      try {
+        const res = await fetch(url, { headers: { 'X-Room-Password': encodeURIComponent(password) } });
+        if (seq !== searchSeq) return; // 더 최근 검색이 있으면 버림
+        if (!res.ok) { searchResults.style.display = 'none'; return; }
+        const data = await res.json();
+        if (seq !== searchSeq) return;
+        if (!beforeId) searchResults.innerHTML = '';
+        const more = searchResults.querySelector('.search-more');
+        if (more) more.remove();
+        if (!beforeId && !data.results.length) {
+          searchResults.innerHTML = '<div style="padding:8px 12px;color:var(--muted);">검색 결과가 없습니다.</div>';
+        }
+        data.results.forEach(r => {
+          const item = document.createElement('div');
+          item.style.cssText = 'padding:6px 12px;border-bottom:1px solid var(--border);cursor:pointer;';
+          // snippet은 서버에서 이스케이프 후 일치 부분만 <mark>로 감싼 HTML
+          item.innerHTML = `<b style="color:${esc(r.color || '#1a73e8')}">${esc(r.from || '')}</b> ${renderTimestamp(r.timestamp)}<div>${r.snippet}</div>`;
+          item.onclick = () => {
+            const el = log.querySelector(`[data-msg-id="${r.id}"]`);
+            if (!el) { showStatus('이전 메시지는 위로 스크롤해서 불러오세요', 'success'); return; }
+            el.scrollIntoView({behavior: 'smooth', block: 'center'});
+            el.style.background = '#fff3cd';
+            setTimeout(() => { el.style.background = ''; }, 1500);
+          };
+          searchResults.appendChild(item);
+        });
+        if (data.next_before_id) {
+          const moreBtn = document.createElement('div');
+          moreBtn.className = 'search-more';
+          moreBtn.style.cssText = 'padding:6px 12px;text-align:center;cursor:pointer;color:#1a73e8;';
+          moreBtn.textContent = '더 보기';
+          moreBtn.onclick = () => runServerSearch(query, data.next_before_id);
+          searchResults.appendChild(moreBtn);
+        } else if (data.partial) {
+          const note = document.createElement('div');
+          note.style.cssText = 'padding:6px 12px;color:var(--muted);font-size:12px;';
+          note.textContent = '보존 기간이 지나 보관된 이전 메시지는 검색되지 않습니다.';
+          searchResults.appendChild(note);
+        }
+        searchResults.style.display = 'block';
+      } catch (e) {
+        console.error('Search failed:', e);
+      }
+    }
+    searchInput.addEventListener('input', () => {
+      const query = searchInput.value.trim();
+      clearTimeout(searchTimer);
+      if (!query) {
+        searchSeq++;
+        if (searchResults) { searchResults.innerHTML = ''; searchResults.style.display = 'none'; }
+        return;
+      }
+      searchTimer = setTimeout(() => runServerSearch(query), 300);
+    });
+
     clearSearch.onclick = () => {
       searchInput.value = '';
       searchInput.dispatchEvent(new Event('input'));